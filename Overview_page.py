@@ -2,27 +2,80 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px  #Plotly is used for charting
 from datetime import datetime
+import overview_rollups #maintained totals for purchases and consumption
+import figure_cache #charts are only rebuilt when the flat's data changed
 
-#initialize session state keys
-if "roommates" not in st.session_state: #check if roommates exists in session state
-    st.session_state["roommates"] = ["Livio", "Flurin", "Anderin"]  #initialize with example roommates
-if "expenses" not in st.session_state: #check if expenses exist in session state
-    st.session_state["expenses"] = {mate: 0.0 for mate in st.session_state["roommates"]} #initialize expenses (per roommate)
-if "purchases" not in st.session_state: #check if purchases exist in session state
-    st.session_state["purchases"] = {mate: [] for mate in st.session_state["roommates"]} #initialize purchases (per roommate)
-if "consumed" not in st.session_state:#check if consumed goods exist in session state
-    st.session_state["consumed"] = {mate: [] for mate in st.session_state["roommates"]} #initialize consumtion (per roommate)
+#functions to build the four charts (None if there is no data), the page gets them from the figure cache
+def expenses_chart():
+    expense_df = pd.DataFrame(list(st.session_state["expenses"].items()), columns=["Roommate", "Total Expenses (CHF)"]) #convert expenses to dataframe
+    if expense_df.empty: #check if data available
+        return None
+    return px.bar(expense_df, x="Roommate", y="Total Expenses (CHF)", title="Total Expenses by Flatmate") #create bar chart
+
+
+def monthly_purchases_chart(rollups, current_month):
+    by_day = rollups["purchases"]["by_day"] #day -> roommate -> total
+    #step 1: days of the current month (dates are "YYYY-MM-DD", so the prefix is the month)
+    days = sorted(day for day in by_day if day.startswith(current_month))
+    month_mates = [mate for mate in st.session_state["roommates"] if any(mate in by_day[day] for day in days)]
+
+    #step 2: long format for plotly, 0 for roommates without purchases on a day
+    daily_purchases_long = pd.DataFrame(
+        [(day, mate, by_day[day].get(mate, 0.0)) for mate in month_mates for day in days],
+        columns=["Date", "Roommate", "Total Purchases (CHF)"],
+    )
+    if daily_purchases_long.empty: #check if data of this month available
+        return None
+
+    # step 3: visualize data
+    return px.line(
+        daily_purchases_long,
+        x="Date",
+        y="Total Purchases (CHF)",
+        color="Roommate",
+        title=f"Daily Purchases by Flatmate - {datetime.now().strftime('%B %Y')}",
+        markers=True,  #add markers -> better visibility
+    )
+
+
+def consumption_chart(rollups):
+    consumption_totals = rollups["consumed"]["by_mate"] #consumption per roommate
+    consumption_df = pd.DataFrame([(mate, consumption_totals.get(mate, 0.0)) for mate in st.session_state["roommates"]],
+                                  columns=["Roommate", "Total Consumption (CHF)"]) #convert to dataframe
+    if consumption_df.empty: #check if data available
+        return None
+    fig3 = px.pie(consumption_df, names="Roommate", values="Total Consumption (CHF)",
+                  title="Total Consumption by Flatmate", hole=0.3,  #create pie chart
+                  color_discrete_sequence=px.colors.qualitative.Pastel) #use pastel colors
+    fig3.update_traces(textinfo='percent+label', hoverinfo='label+percent+value') #update chart labels
+    return fig3
+
+
+def inventory_chart(rollups):
+    by_product = rollups["purchases"]["by_product"] #roommate -> product -> total
+    inventory_summary = pd.DataFrame.from_dict( #one row per roommate, one column per product
+        {mate: by_product[mate] for mate in st.session_state["roommates"] if by_product.get(mate)}, orient="index").fillna(0)
+    if inventory_summary.empty: #check if data available
+        return None
+    inventory_summary.index.name = "Roommate"
+    return px.bar(inventory_summary.reset_index(), 
+                  x="Roommate", y=inventory_summary.columns, 
+                  title="Inventory Value by Roommate", 
+                  labels={"value": "Price (CHF)", "variable": "Product"}, 
+                  barmode="stack") #create stacked bar chart
 
 
 #overview page function
 def overview_page():
     st.title("Flatmate Overview") #set page title
+    rollups = overview_rollups.ensure(st.session_state) #precomputed totals, only rebuilt after login or a merge
+    flat = st.session_state.get("username") #figures are cached per flat and data version (position in the flat's log)
+    version = st.session_state.get("log_seq")
 
     #chart 1: total expenses by flatmate -> bar chart
     st.subheader("1. Total Expenses by Flatmate") #add subheader for chart
-    expense_df = pd.DataFrame(list(st.session_state["expenses"].items()), columns=["Roommate", "Total Expenses (CHF)"]) #convert expenses to dataframe
-    if not expense_df.empty: #check if data available
-        fig1 = px.bar(expense_df, x="Roommate", y="Total Expenses (CHF)", title="Total Expenses by Flatmate") #create bar chart
+    fig1 = figure_cache.cached(flat, version, "expenses", expenses_chart)
+    if fig1 is not None:
         st.plotly_chart(fig1) #display chart
     else:
         st.write("No expense data available.") #if no data -> display message
@@ -30,57 +83,10 @@ def overview_page():
 
     #chart 2: monthly purchases by flatmate -> line chart
     st.subheader("2. Monthly Purchases by Flatmate") #add subheader for chart
-
-    #step 1:collect purchase data
-    purchases_data = [] #initialize empty list to store data of purchases
-    for mate in st.session_state["roommates"]: #go over each roommate
-        purchases_data.extend([ #extend data list with purchase details
-            {
-                "Roommate": mate,
-                "Date": purchase.get("Date", "1900-01-01"),  #get date or use default
-                "Total": purchase.get("Price", 0)           # get price or use 0
-            }
-            for purchase in st.session_state["purchases"][mate] #loop through roomatess purchases
-        ])
-
-    #step 2: create dataframe
-    purchases_df = pd.DataFrame(purchases_data) #convert purchase data into dataframe
-
-    if not purchases_df.empty: #check if data available
-        # Step 3: Convert Date to datetime
-        purchases_df["Date"] = pd.to_datetime(purchases_df["Date"], errors="coerce")  # convert values in "date" to datetime ebjects 
-    
-        
-        #step 4: filter for the current month and year
-        current_month = datetime.now().month #get month
-        current_year = datetime.now().year #get year
-        purchases_df = purchases_df[ #filter dataframe for current month & year
-            (purchases_df["Date"].dt.month == current_month) & 
-            (purchases_df["Date"].dt.year == current_year)
-        ]
-
-        #step 5: group data by date date and roommate
-        daily_purchases = purchases_df.groupby([purchases_df["Date"].dt.date, "Roommate"])["Total"].sum().unstack(fill_value=0)
-
-        # Step 6: reshape for plotly (Convert to long format for Plotly)
-        daily_purchases_long = daily_purchases.reset_index().melt(
-            id_vars=["Date"], 
-            var_name="Roommate", 
-            value_name="Total Purchases (CHF)" #reshape dataframe for line chart
-        )
-
-        
-
-        # step 7: visualize data
-        if not daily_purchases_long.empty: #check if reshaped data available
-            fig2 = px.line(
-                daily_purchases_long,
-                x="Date",
-                y="Total Purchases (CHF)",
-                color="Roommate",
-                title=f"Daily Purchases by Flatmate - {datetime.now().strftime('%B %Y')}",
-                markers=True,  #add markers -> better visibility
-            )
+    if rollups["purchases"]["by_day"]: #check if data available
+        current_month = datetime.now().strftime("%Y-%m") #the chart changes with the month too
+        fig2 = figure_cache.cached(flat, version, f"monthly {current_month}", lambda: monthly_purchases_chart(rollups, current_month))
+        if fig2 is not None:
             st.plotly_chart(fig2) #show line chart
         else:
             st.write("No data available for the current month.") #message if no data available
@@ -88,39 +94,30 @@ def overview_page():
         st.write("No purchases data available.") #message if no purchase data
 
 
-
-
     #chart 3: total consumption by flatmate -> pie chart
     st.subheader("3. Total Consumption by Flatmate") #add a subheader for chart
-    consumption_data = {mate: sum([item["Price"] for item in st.session_state["consumed"][mate]]) #calculate consumtion (per roommmate)
-                        for mate in st.session_state["roommates"]}
-    consumption_df = pd.DataFrame(list(consumption_data.items()), columns=["Roommate", "Total Consumption (CHF)"]) #convert to dataframe
-    if not consumption_df.empty: #check if data available
-        fig3 = px.pie(consumption_df, names="Roommate", values="Total Consumption (CHF)",
-                      title="Total Consumption by Flatmate", hole=0.3,  #create pie chart
-                      color_discrete_sequence=px.colors.qualitative.Pastel) #use pastel colors
-        fig3.update_traces(textinfo='percent+label', hoverinfo='label+percent+value') #update chart labels
+    fig3 = figure_cache.cached(flat, version, "consumption", lambda: consumption_chart(rollups))
+    if fig3 is not None:
         st.plotly_chart(fig3) #show pie chart
     else:
         st.write("No consumption data available.") #message if no consumtion data
 
     #chart 4: inventory summary-> stacked bar chart)
     st.subheader("4. Inventory Value by Roommate") #add subhead for chart
-    inventory_data = [] #initialize empty list for inventory data
-    for mate in st.session_state["roommates"]: #go trough each roommate
-        for purchase in st.session_state["purchases"][mate]: #loop throiugh roommates purchases
-            inventory_data.append({"Roommate": mate, "Product": purchase["Product"], "Price": purchase["Price"]}) #add product details
-    inventory_df = pd.DataFrame(inventory_data) #convert inventory to dataframe
-    if not inventory_df.empty: #check if data available
-        inventory_summary = inventory_df.groupby(["Roommate", "Product"])["Price"].sum().unstack(fill_value=0) #groups databy roomate and product
-        fig4 = px.bar(inventory_summary.reset_index(), 
-                      x="Roommate", y=inventory_summary.columns, 
-                      title="Inventory Value by Roommate", 
-                      labels={"value": "Price (CHF)", "variable": "Product"}, 
-                      barmode="stack") #create stacked bar chart
+    fig4 = figure_cache.cached(flat, version, "inventory", lambda: inventory_chart(rollups))
+    if fig4 is not None:
         st.plotly_chart(fig4) #show bar chart
     else:
         st.write("No inventory data available.") #message if there is no inventory
 
-#call function to generate/display the page
-overview_page()
+#run this page on its own for testing with example roommates: streamlit run Overview_page.py
+if __name__ == "__main__":
+    if "roommates" not in st.session_state: #check if roommates exists in session state
+        st.session_state["roommates"] = ["Livio", "Flurin", "Anderin"]  #initialize with example roommates
+    if "expenses" not in st.session_state: #check if expenses exist in session state
+        st.session_state["expenses"] = {mate: 0.0 for mate in st.session_state["roommates"]} #initialize expenses (per roommate)
+    if "purchases" not in st.session_state: #check if purchases exist in session state
+        st.session_state["purchases"] = {mate: [] for mate in st.session_state["roommates"]} #initialize purchases (per roommate)
+    if "consumed" not in st.session_state:#check if consumed goods exist in session state
+        st.session_state["consumed"] = {mate: [] for mate in st.session_state["roommates"]} #initialize consumtion (per roommate)
+    overview_page()
@@ -1,59 +1,38 @@
 import streamlit as st 
 import pandas as pd 
 from PIL import Image #used for editing images
-from pyzbar.pyzbar import decode #used for decoing barcode
+import job_queue #heavy work (receipt OCR, bulk scans) runs in background worker processes
+import barcode_scanner #decoding pipeline: small grayscale pass first, slower passes only when needed
 import requests #to to request data from API
-from datetime import datetime  # to record the date and time
-
-#initialization of the session status for saving values between interactions
-#The following part is unnecessary because it is only used to run and test this page
-if "inventory" not in st.session_state:
-    st.session_state["inventory"] = {}
-if "roommates" not in st.session_state:
-    st.session_state["roommates"] = ["Livio", "Flurin", "Anderin"]
-if "expenses" not in st.session_state:
-    st.session_state["expenses"] = {mate: 0.0 for mate in st.session_state["roommates"]}
-if "purchases" not in st.session_state:
-    st.session_state["purchases"] = {mate: [] for mate in st.session_state["roommates"]}
+import product_cache #local cache of Open Food Facts products
+import units #unit names the inventory can convert
+import inventory #shared inventory: products, expenses and purchases are changed together
+import history_view #paged history tables
+import time #to check the background jobs again after a moment
+import io #to read uploaded files from memory
+import math #to find cells that hold no number
+import zipfile #to read zip files with many images
+
+IMAGE_TYPES = (".jpg", ".jpeg", ".png")
 
 #function to recognize and decode barcode in picture
 def barcode_decode(image):
-    decoded_objects = decode(image)  #searching the barcode and save the list of barcodes in the variable
-    for obj in decoded_objects:
-        return obj.data.decode("utf-8") #convert a binary number into a string
-    return None #returns non if no barcode was found
+    return barcode_scanner.decode_first(image) #returns None if no barcode was found
 
 #function to get product information
 def get_product_info(barcode):
-    url = f"https://world.openfoodfacts.org/api/v0/product/{barcode}.json" #URL refers to the Open Food Facts API
-    response = requests.get(url) #connects to the Open Food Facts API and sends a request
-    if response.status_code == 200: #it means that the request was successful and the data is available
-        data = response.json() #Converts the response data from JSON into a Python dictionary
-        if data.get("status") == 1:  #if status one: Barcode exists in the database, if status 0: Barcode does not exist in the database
-            product = data["product"] #extract product information and return name and brand
-            return {
-                "name": product.get("product_name", "Unknown Product"), #when no value available default value
-                "brand": product.get("brands", "Unknown Brand")
-            }
-    return None #return None, if barcode does not exist in the database
+    try:
+        return product_cache.get_product(barcode) #local cache first, Open Food Facts API only for new barcodes
+    except requests.RequestException: #API not reachable or too slow
+        return None #return None, if barcode information is not available
 
 # Function to add product to inventory
-def add_product_to_inventory(food_item, quantity, unit, price, selected_roommate): 
-    purchase_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S") #save the time at which a product is added to the inventory
-    if food_item in st.session_state["inventory"]:  # checks if the food is already in the inventory to ensure that no product appears twice by name in the Invenory
-        st.session_state["inventory"][food_item]["Quantity"] += quantity # add the quantity to the existing quantity
-        st.session_state["inventory"][food_item]["Price"] += price # add the price to the existing price
-    else:
-        st.session_state["inventory"][food_item] = {"Quantity": quantity, "Unit": unit, "Price": price} # if the product is not currently in the inventory, it will be added as a new one and the quantity, unit and price will be adopted
-    
-    st.session_state["expenses"][selected_roommate] += price # the cost of the product is added to the total expenses of the person
-    st.session_state["purchases"][selected_roommate].append({ # the entire purchase is saved in the history
-        "Product": food_item,
-        "Quantity": quantity,
-        "Price": price,
-        "Unit": unit,
-        "Date": purchase_time
-    })
+def add_product_to_inventory(food_item, quantity, unit, price, selected_roommate, expiry=None): 
+    try:
+        inventory.add_items(st.session_state, selected_roommate, [(food_item, quantity, unit, price, expiry)]) #inventory, expenses and purchase history in one step
+    except ValueError as error: #unit doesn't fit the product in the inventory -> nothing was added
+        st.warning(str(error))
+        return
     st.success(f"'{food_item}' has been added to the inventory, and {selected_roommate}'s expenses were updated.") #displays to the user that the product has been successfully added to the inventory
 
 #function to show total expenses in a table
@@ -65,25 +44,12 @@ def display_total_expenses():
 #function to show purchases per roommate
 def display_purchases():
     with st.expander("Purchases per Roommate"):  #function that allows the user to expand or hide the information about purchases
-        for roommate in st.session_state["purchases"]:
-            st.write(f"**{roommate}**")  # display the name of the current roommate in fat letters
-            
-            purchases = st.session_state["purchases"][roommate]  # Access the list of purchases of the current roommate and save the list in the variable
-            
-            if purchases:  # checks if the roommate has already made purchases
-                data = []  # create an empty list to collect the purchases. Required to create a DataFrame later
-                
-                for purchase in purchases:  # process each purchase from the roommate individually and extract the data from it
-                    data.append([purchase["Product"], purchase["Quantity"], purchase["Price"], purchase["Unit"], purchase["Date"]]) # Extract details of purchase and add them to the data list
-                
-                purchases_df = pd.DataFrame(data, columns=["Product", "Quantity", "Price", "Unit", "Date"]) # Change the data into a table format and define the columntitle
-                st.table(purchases_df) # display the table
-            else:
-                st.write("No purchases recorded.")  #message if there are no purchases
+        start, end = history_view.date_range_filter("scan_history_range") #only this period is shown
+        roommate = st.selectbox("Roommate:", ["All roommates"] + list(st.session_state["purchases"]), key="scan_history_mate")
+        history_view.history_table("purchases", None if roommate == "All roommates" else roommate, start, end, "scan_purchases") #one page, newest first
 
-# main page function
-def barcode_page():
-    st.title("Upload your barcode") # define the title of the side
+#function to scan a single barcode and add the product by hand
+def single_scan():
     uploaded_file = st.file_uploader("Upload an image with a barcode", type=["jpg", "jpeg", "png"]) # function that people can upload files
 
     if uploaded_file is not None: # checks if an image has been uploaded
@@ -110,20 +76,173 @@ def barcode_page():
             # correct and add information manually
             selected_roommate = st.selectbox("Who bought the product?", st.session_state["roommates"])
             quantity = st.number_input("Quantity:", min_value=0.0, step=0.1, format="%.1f")
-            unit = st.selectbox("Unit:", ["Pieces", "Liters", "Grams"])
+            unit = st.selectbox("Unit:", units.CHOICES)
             price = st.number_input("Price (in CHF):", min_value=0.0, step=0.1, format="%.2f")
+            expiry = st.date_input("Best before (optional):", value=None) #printed on the package
 
             if st.button("Add product to inventory"):
                 if food_item and quantity > 0 and price >= 0: # make sure that all fields have been filled in
-                    add_product_to_inventory(food_item, quantity, unit, price, selected_roommate) #add product to the inventory
+                    add_product_to_inventory(food_item, quantity, unit, price, selected_roommate, expiry) #add product to the inventory
                 else:
                     st.warning("Please fill in all fields.")
         else:
             st.write("No barcode found in the image.") #return that no barcode was found on the picture
 
+#function to turn the uploaded files (images or zip files with images) into a list of (name, image bytes)
+def expand_uploads(uploaded_files):
+    images = []
+    for uploaded_file in uploaded_files:
+        if uploaded_file.name.lower().endswith(".zip"): #take every image out of the zip file
+            with zipfile.ZipFile(io.BytesIO(uploaded_file.getvalue())) as archive:
+                for name in archive.namelist():
+                    if name.lower().endswith(IMAGE_TYPES):
+                        images.append((name, archive.read(name)))
+        else:
+            images.append((uploaded_file.name, uploaded_file.getvalue()))
+    return images
+
+#function to show the progress of a background job, returns its result once it is done
+def job_result(job_id, message):
+    job = job_queue.status(job_id)
+    if job is None:
+        return None
+    if job["status"] == job_queue.DONE:
+        return job_queue.result(job_id)
+    if job["status"] in (job_queue.QUEUED, job_queue.RUNNING):
+        waiting = f"{job['waiting']} jobs before yours" if job["status"] == job_queue.QUEUED else "running"
+        st.info(f"{message} ({waiting})")
+        if st.button("Cancel", key=f"cancel_job_{job_id}"):
+            job_queue.cancel(job_id)
+        time.sleep(1) #the page doesn't wait for the job, it only checks again
+        st.rerun()
+    if job["status"] == job_queue.FAILED:
+        st.error(f"{message} failed: {job['error']}")
+    else:
+        st.write("Cancelled.")
+    if st.button("Try again", key=f"retry_job_{job_id}"):
+        job_queue.retry(job_id)
+        st.rerun()
+    return None
+
+#function to read a number from an edited table cell, None for empty cells (cleared cells are NaN or None)
+def cell_number(value):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
+
+#function to add many products at once: everything is checked first, then added together
+def add_products_to_inventory(rows, selected_roommate):
+    selected = [row for row in rows if not pd.isna(row["Add"]) and row["Add"]]
+    invalid = [str(row.get("Barcode") or row.get("Receipt line")) for row in selected
+               if pd.isna(row["Product"]) or not str(row["Product"]).strip()
+               or cell_number(row["Quantity"]) is None or cell_number(row["Quantity"]) <= 0
+               or cell_number(row["Price"]) is None or cell_number(row["Price"]) < 0]
+    if invalid: #nothing is added if one row is incomplete
+        st.warning(f"Please fill in product, quantity and price for: {', '.join(invalid)}")
+        return False
+    try:
+        inventory.add_items(st.session_state, selected_roommate, #one batch: inventory, expenses and history in one pass
+                            [(str(row["Product"]).strip(), cell_number(row["Quantity"]), row["Unit"], cell_number(row["Price"]))
+                             for row in selected])
+    except ValueError as error: #e.g. grams of a product that is stored in pieces -> nothing of the batch was added
+        st.warning(str(error))
+        return False
+    st.success(f"{len(selected)} products have been added to the inventory, and {selected_roommate}'s expenses were updated.")
+    return True
+
+#function to scan a whole shopping bag: many images (or a zip), many barcodes per image
+def bulk_scan():
+    uploaded_files = st.file_uploader("Upload images (or a zip file) with barcodes", type=list(IMAGE_TYPES) + ["zip"],
+                                      accept_multiple_files=True)
+    if not uploaded_files:
+        return
+    upload_key = tuple((uploaded_file.name, uploaded_file.size) for uploaded_file in uploaded_files)
+    if st.session_state.get("bulk_scan_key") != upload_key: #scan only once per upload, not on every rerun
+        st.session_state["bulk_scan_job"] = job_queue.submit("bulk_scan", expand_uploads(uploaded_files))
+        st.session_state["bulk_scan_key"] = upload_key
+    if st.session_state.get("bulk_scan_added") == upload_key: #the files are still in the uploader after adding them
+        st.write("These products have been added to the inventory.")
+        return
+
+    rows = job_result(st.session_state["bulk_scan_job"], "Scanning barcodes and searching for products")
+    if rows is None:
+        return
+    if not rows:
+        st.write("No barcode found in the images.")
+        return
+    st.write(f"{len(rows)} different products found. Check the table and fill in quantities and prices:")
+    edited = st.data_editor(
+        pd.DataFrame(rows),
+        column_config={"Unit": st.column_config.SelectboxColumn("Unit", options=units.CHOICES)},
+        disabled=["Barcode"],
+        hide_index=True,
+        key="bulk_scan_editor",
+    )
+    selected_roommate = st.selectbox("Who bought the products?", st.session_state["roommates"], key="bulk_roommate")
+    if st.button("Add all selected products to inventory"):
+        if add_products_to_inventory(edited.to_dict("records"), selected_roommate):
+            st.session_state["bulk_scan_added"] = upload_key
+
+#function to add a whole shopping trip from the receipt (photo or PDF)
+def receipt_scan():
+    uploaded_file = st.file_uploader("Upload a photo or PDF of your receipt", type=["jpg", "jpeg", "png", "pdf"])
+    if uploaded_file is None:
+        return
+    upload_key = (uploaded_file.name, uploaded_file.size)
+    if st.session_state.get("receipt_key") != upload_key: #read each receipt only once
+        st.session_state["receipt_job"] = job_queue.submit("receipt", uploaded_file.getvalue(), uploaded_file.name, inventory.products(st.session_state))
+        st.session_state["receipt_key"] = upload_key
+    if st.session_state.get("receipt_added") == upload_key: #the same receipt is not added twice by accident
+        st.write("This receipt has been added to the inventory.")
+        return
+
+    rows = job_result(st.session_state["receipt_job"], "Reading the receipt") #unreadable files show the error and a retry button
+    if rows is None:
+        return
+    if not rows:
+        st.write("No articles found on the receipt.")
+        return
+    st.write(f"{len(rows)} articles found, {sum(row['Add'] for row in rows)} of them are food we know. Check the table:")
+    edited = st.data_editor(
+        pd.DataFrame(rows, columns=["Add", "Product", "Quantity", "Unit", "Price", "Receipt line"]),
+        column_config={"Unit": st.column_config.SelectboxColumn("Unit", options=units.CHOICES)},
+        disabled=["Receipt line"],
+        hide_index=True,
+        key="receipt_editor",
+    )
+    selected_roommate = st.selectbox("Who paid?", st.session_state["roommates"], key="receipt_roommate")
+    if st.button("Add all selected articles to inventory"):
+        if add_products_to_inventory(edited.to_dict("records"), selected_roommate):
+            st.session_state["receipt_added"] = upload_key
+
+# main page function
+def barcode_page():
+    st.title("Upload your barcode") # define the title of the side
+    mode = st.radio("Scan mode:", ["Single product", "Bulk scan (many products)", "Receipt"], horizontal=True)
+    if mode == "Single product":
+        single_scan()
+    elif mode == "Bulk scan (many products)":
+        bulk_scan()
+    else:
+        receipt_scan()
+
+    cache = product_cache.stats()
+    if cache["hits"] + cache["negative_hits"] + cache["misses"]: #show how often the local product cache answered
+        st.caption(f"Product cache hit rate: {cache['hit_rate']:.0%}")
+
     display_total_expenses() #calls previous define function to display the expenses
     display_purchases() #calls previous define function to display the purchases
 
-# the following part is unnecessary because it is only used to run and test this page
-# Run page
-barcode_page()
\ No newline at end of file
+#run this page on its own for testing with example roommates: streamlit run barcode_page.py
+if __name__ == "__main__":
+    if "inventory" not in st.session_state:
+        st.session_state["inventory"] = {}
+    if "roommates" not in st.session_state:
+        st.session_state["roommates"] = ["Livio", "Flurin", "Anderin"]
+    if "expenses" not in st.session_state:
+        st.session_state["expenses"] = {mate: 0.0 for mate in st.session_state["roommates"]}
+    if "purchases" not in st.session_state:
+        st.session_state["purchases"] = {mate: [] for mate in st.session_state["roommates"]}
+    barcode_page()
\ No newline at end of file
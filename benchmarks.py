@@ -0,0 +1,403 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+#small benchmarks for the storage and data code, run with: python benchmarks.py <name> [size]
+#every benchmark works in a temporary directory and prints its timings
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+#benchmark: user lookups and registrations with many registered flats
+def bench_user_directory(count=100_000):
+    from user_directory import UserDirectory
+    from storage_backends import SqliteBackend
+
+    directory = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+        users = {f"flat{i}": f"password{i}" for i in range(count)}
+        probes = [f"flat{i}" for i in range(0, count, max(count // 1000, 1))]
+
+        #old way: parse users.json on every login and rewrite it on every registration
+        with open("users.json", "w") as file:
+            json.dump(users, file)
+        def legacy_lookups():
+            for username in probes[:20]: #every lookup parses the whole file, a few are enough
+                with open("users.json", "r") as file:
+                    json.load(file).get(username)
+        def legacy_register():
+            with open("users.json", "r") as file:
+                existing = json.load(file)
+            existing["new flat"] = "password"
+            with open("users.json", "w") as file:
+                json.dump(existing, file)
+        _, seconds = timed(legacy_lookups)
+        print(f"users.json      lookup:   {seconds / len(probes[:20]) * 1e6:10.1f} us per login ({count} flats)")
+        _, seconds = timed(legacy_register)
+        print(f"users.json      register: {seconds * 1e6:10.1f} us per sign up")
+        os.remove("users.json")
+
+        #one file per user
+        directory_users = UserDirectory("users")
+        _, seconds = timed(lambda: [directory_users.add(name, password) for name, password in users.items()])
+        print(f"user directory  insert:   {seconds / count * 1e6:10.1f} us per sign up ({count} flats)")
+        _, seconds = timed(lambda: [directory_users.get_password(name) for name in probes])
+        print(f"user directory  lookup:   {seconds / len(probes) * 1e6:10.1f} us per login")
+
+        #sqlite table with primary key
+        sqlite_users = SqliteBackend("bench.db")
+        db = sqlite_users._connection()
+        with db:
+            db.executemany("INSERT INTO users (username, password) VALUES (?, ?)", users.items())
+        _, seconds = timed(lambda: [sqlite_users.add_user(f"new{i}", "password") for i in range(1000)])
+        print(f"sqlite          insert:   {seconds / 1000 * 1e6:10.1f} us per sign up ({count} flats)")
+        _, seconds = timed(lambda: [sqlite_users.get_password(name) for name in probes])
+        print(f"sqlite          lookup:   {seconds / len(probes) * 1e6:10.1f} us per login")
+
+        #concurrent sign ups must not lose each other's writes
+        def register_many(prefix):
+            for i in range(500):
+                directory_users.add(f"{prefix}-{i}", "password")
+        threads = [threading.Thread(target=register_many, args=(f"thread{t}",)) for t in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        registered = sum(1 for name in directory_users.usernames() if name.startswith("thread"))
+        print(f"concurrent sign ups: {registered} of {8 * 500} stored")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def rss_mb():
+    """Resident memory of this process in MB (linux: current, elsewhere: peak)"""
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except OSError:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1e6 if sys.platform == "darwin" else peak / 1e3
+
+
+#benchmark: memory per session and time to first recommendation, per-session loading vs shared registry
+def bench_model_loading(sessions=5):
+    import model_registry
+    import __main__
+    __main__.custom_tokenizer = model_registry.custom_tokenizer #the vectorizer was pickled with the tokenizer from main.py
+
+    ingredients = "chicken, curry powder, coconut milk, onion"
+
+    #before: every session loaded its own copy (old load_ml_components with st.session_state)
+    base = rss_mb()
+    copies = []
+    for _ in range(sessions):
+        start = time.perf_counter()
+        components = model_registry._load()
+        components["ml_model"].predict(components["vectorizer"].transform([ingredients]).toarray(), verbose=0)
+        copies.append(components)
+        print(f"per-session load: first recommendation after {time.perf_counter() - start:6.3f} s")
+    print(f"per-session load: {(rss_mb() - base) / sessions:8.1f} MB per session")
+    del copies
+
+    #after: all sessions share the registry
+    base = rss_mb()
+    for _ in range(sessions):
+        start = time.perf_counter()
+        components = model_registry.get_components()
+        components["ml_model"].predict(components["vectorizer"].transform([ingredients]).toarray(), verbose=0)
+        print(f"shared registry:  first recommendation after {time.perf_counter() - start:6.3f} s")
+    print(f"shared registry:  {(rss_mb() - base) / sessions:8.1f} MB per session ({model_registry.stats()['loads']} load)")
+
+
+#benchmark: cold start of main.py with and without importing the ML stack
+def bench_startup(runs=3):
+    import subprocess
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    variants = {
+        "main.py (ML stack lazy)": "import main",
+        "main.py + tensorflow (old eager import)": "import tensorflow, joblib; import main",
+        "tensorflow alone": "import tensorflow",
+    }
+    for name, code in variants.items():
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            result = subprocess.run([sys.executable, "-c", code], cwd=here, capture_output=True,
+                                    env=dict(os.environ, WASTELESS_ML_WARMUP="0"))
+            timings.append(time.perf_counter() - start)
+            if result.returncode != 0:
+                print(f"{name}: failed ({result.stderr.decode().strip().splitlines()[-1]})")
+                break
+        else:
+            print(f"{name:42s} {min(timings):6.2f} s (best of {runs})")
+
+
+#synthetic barcode photos: EAN-13 codes drawn with PIL and placed into a large "photo"
+EAN_LEFT = ["0001101", "0011001", "0010011", "0111101", "0100011", "0110001", "0101111", "0111011", "0110111", "0001011"]
+EAN_PARITY = ["LLLLLL", "LLGLGG", "LLGGLG", "LLGGGL", "LGLLGG", "LGGLLG", "LGGGLL", "LGLGLG", "LGLGGL", "LGGLGL"]
+
+
+def ean13(digits12):
+    """Complete 12 digits with the check digit"""
+    total = sum(int(digit) * (3 if i % 2 else 1) for i, digit in enumerate(digits12))
+    return digits12 + str((10 - total % 10) % 10)
+
+
+def ean13_image(code, module=3, height=120):
+    """Draw an EAN-13 barcode (white background, quiet zone of 10 modules)"""
+    from PIL import Image, ImageDraw
+    right = ["".join("1" if bit == "0" else "0" for bit in pattern) for pattern in EAN_LEFT]
+    bits = "101"
+    for digit, parity in zip(code[1:7], EAN_PARITY[int(code[0])]):
+        bits += EAN_LEFT[int(digit)] if parity == "L" else right[int(digit)][::-1] #G codes are the mirrored R codes
+    bits += "01010"
+    for digit in code[7:]:
+        bits += right[int(digit)]
+    bits += "101"
+    image = Image.new("L", ((len(bits) + 20) * module, height), 255)
+    draw = ImageDraw.Draw(image)
+    for i, bit in enumerate(bits):
+        if bit == "1":
+            draw.rectangle(((i + 10) * module, 0, (i + 11) * module - 1, height - 1), fill=0)
+    return image
+
+
+def barcode_corpus(count=40, size=(4032, 3024), seed=1):
+    """Yield (expected code, kind, image) for phone-sized photos: plain, skewed, washed out, small and blurred codes"""
+    import random
+    from PIL import Image, ImageFilter
+    rng = random.Random(seed)
+    kinds = ["plain", "skewed", "low contrast", "small", "blurred"]
+    for i in range(count):
+        code = ean13("".join(str(rng.randrange(10)) for _ in range(12)))
+        kind = kinds[i % len(kinds)]
+        photo = Image.effect_noise(size, 30).point(lambda value: 90 + value // 3) #grey, noisy background like a table
+        barcode = ean13_image(code, module=2 if kind == "small" else rng.choice([5, 6, 8]), height=300).convert("RGB")
+        if kind == "skewed":
+            barcode = barcode.rotate(rng.choice([-35, -25, 25, 35]), expand=True, fillcolor=(255, 255, 255))
+        if kind == "low contrast":
+            barcode = barcode.point(lambda value: 110 + value * 40 // 255) #grey bars on a grey label
+        if kind == "blurred":
+            barcode = barcode.filter(ImageFilter.GaussianBlur(2))
+        left = rng.randrange(size[0] - barcode.width)
+        top = rng.randrange(size[1] - barcode.height)
+        photo = photo.convert("RGB")
+        photo.paste(barcode, (left, top))
+        yield code, kind, photo
+
+
+#benchmark: decoding photos directly with pyzbar vs the preprocessing pipeline
+def bench_barcode_decoding(count=40):
+    import barcode_scanner
+    try:
+        from pyzbar.pyzbar import decode
+    except ImportError:
+        print("pyzbar (and the zbar library) is needed for this benchmark")
+        return
+    corpus = list(barcode_corpus(count))
+    results = {"direct": {}, "pipeline": {}, "complete": {}}
+    for code, kind, photo in corpus:
+        found, seconds = timed(lambda: [obj.data.decode("utf-8") for obj in decode(photo)])
+        results["direct"].setdefault(kind, []).append((code in found, seconds))
+        found, seconds = timed(barcode_scanner.decode_all, photo)
+        results["pipeline"].setdefault(kind, []).append((code in found, seconds))
+        found, seconds = timed(lambda: barcode_scanner.decode_all(photo, complete=True)) #small image, full image and all tiles
+        results["complete"].setdefault(kind, []).append((code in found, seconds))
+    for method, kinds in results.items():
+        for kind, runs in kinds.items():
+            found = sum(ok for ok, _ in runs)
+            print(f"{method:8s} {kind:12s} found {found:3d}/{len(runs):3d}   {sum(s for _, s in runs) / len(runs) * 1000:8.1f} ms per photo")
+    print("pipeline stages:")
+    for stage, stage_stats in barcode_scanner.stats().items():
+        print(f"  {stage:10s} runs {stage_stats['runs']:4d}  success {stage_stats['success_rate']:5.0%}  {stage_stats['average_ms']:8.1f} ms")
+
+
+#benchmark: memory and scan speed of the history as lists of dicts vs the columnar store
+def bench_history(count=1_000_000):
+    import random
+    import tracemalloc
+    import numpy as np
+    import pandas as pd
+    import history_store
+
+    rng = random.Random(1)
+    mates = ["Livio", "Flurin", "Anderin", "Bela"]
+    products = [f"product {i}" for i in range(300)]
+    from datetime import datetime, timedelta
+    first_day = datetime(2023, 1, 1)
+    start = pd.Timestamp(first_day).value // 10**9
+    tracemalloc.start()
+    history = {mate: [] for mate in mates}
+    for i in range(count): #one event every minute, in time order like in the app
+        history[mates[rng.randrange(len(mates))]].append({
+            "Product": products[rng.randrange(len(products))], "Quantity": float(rng.randrange(1, 5)),
+            "Price": round(rng.uniform(0.5, 20), 2), "Unit": "Pieces",
+            "Date": (first_day + timedelta(minutes=i)).strftime(history_store.DATE_FORMAT),
+        })
+    dicts_mb = tracemalloc.get_traced_memory()[0] / 1e6
+    tracemalloc.stop()
+    columns, seconds = timed(history_store.build, history)
+    print(f"{count} events")
+    print(f"lists of dicts: {dicts_mb:8.1f} MB")
+    print(f"columns:        {columns.nbytes() / 1e6:8.1f} MB (built in {seconds:.2f} s, once per login)")
+
+    month_start = pd.Timestamp(start + (count // 2) * 60, unit="s").normalize().replace(day=1)
+    month_end = month_start + pd.offsets.MonthBegin(1)
+
+    def dicts_totals():
+        return {mate: sum(entry["Price"] for entry in entries) for mate, entries in history.items()}
+
+    def dicts_month():  #what the overview did: DataFrame, parse dates, filter, group
+        frame = pd.DataFrame([{"Roommate": mate, "Date": entry["Date"], "Total": entry["Price"]}
+                              for mate, entries in history.items() for entry in entries])
+        frame["Date"] = pd.to_datetime(frame["Date"], errors="coerce")
+        frame = frame[(frame["Date"] >= month_start) & (frame["Date"] < month_end)]
+        return frame.groupby([frame["Date"].dt.date, "Roommate"])["Total"].sum()
+
+    def columns_totals():
+        return columns.totals_by("mate")
+
+    def columns_month():
+        rows = columns.select(start=month_start.value // 10**9, end=month_end.value // 10**9)
+        days = columns.column("time")[rows] // 86400
+        keys = (days - days.min()) * len(columns.mates.names) + columns.column("mate")[rows] if len(rows) else days
+        return np.bincount(keys, weights=columns.column("price")[rows]) if len(rows) else keys
+
+    for name, function in [("totals per roommate, dicts", dicts_totals), ("totals per roommate, columns", columns_totals),
+                           ("one month per day, dicts", dicts_month), ("one month per day, columns", columns_month)]:
+        _, seconds = timed(function)
+        print(f"{name:32s} {seconds * 1000:10.1f} ms")
+
+
+#benchmark: "what expires in the next 3 days" with many lots, heap index vs. looking at every lot
+def bench_expiry(count=100_000):
+    import random
+    from datetime import date, timedelta
+    import inventory
+
+    rng = random.Random(1)
+    today = date(2024, 12, 1)
+    state = {"roommates": ["Livio"], "inventory": {}}
+    new_items = [(f"product {i % 5000}", 1.0, "Pieces", 2.0, today + timedelta(days=rng.randrange(1, 365))) for i in range(count)]
+    _, seconds = timed(inventory.add_items, state, "Livio", new_items)
+    print(f"{count} lots of {len(state['inventory'])} products added in {seconds:.2f} s")
+
+    def scan(days):
+        until = (today + timedelta(days=days)).strftime(inventory.DAY_FORMAT)
+        return sorted((lot["Expiry"], name) for name, stored in state["inventory"].items()
+                      for lot in stored["Lots"] if lot["Expiry"] and lot["Expiry"] <= until)
+
+    for days in (1, 3, 7):
+        found, scan_seconds = timed(scan, days)
+        lots, heap_seconds = timed(inventory.expiring_soon, state, days, today)
+        print(f"within {days} days: {len(lots):6d} lots (scan: {len(found)})   "
+              f"scan of all lots {scan_seconds * 1000:8.2f} ms   heap index {heap_seconds * 1000:8.2f} ms")
+
+
+#benchmark: total amount bought per product when the same product was bought in different units
+def bench_units(count=1_000_000):
+    import random
+    import numpy as np
+    import history_store
+    import units
+
+    rng = random.Random(1)
+    bought_in = [("Grams", 250), ("Kilograms", 1.5), ("Milliliters", 330), ("Liters", 1), ("Pieces", 6)]
+    entries = []
+    for i in range(count):
+        unit, size = bought_in[rng.randrange(len(bought_in))]
+        entries.append({"Product": f"product {i % 300}", "Quantity": size * rng.randrange(1, 4), "Price": 2.0, "Unit": unit,
+                        "Date": "2024-12-01 12:00:00"})
+    columns = history_store.build({"Livio": entries})
+
+    def per_entry(): #one registry lookup and one float sum per entry
+        totals = {}
+        for entry in entries:
+            key = (entry["Product"], units.dimension(entry["Unit"]))
+            totals[key] = totals.get(key, 0) + units.to_base(entry["Quantity"], entry["Unit"])
+        return totals
+
+    def vectorized(): #base units for the whole column, then one bincount per dimension
+        amounts = columns.base_quantities()
+        names = (units.MASS, units.VOLUME, units.COUNT)
+        dimensions = np.array([names.index(units.dimension(name)) for name in columns.units.names])[columns.column("unit")]
+        keys = columns.column("product").astype(np.int64) * len(names) + dimensions #product and dimension in one number
+        totals = np.bincount(keys, weights=amounts, minlength=len(columns.products.names) * len(names)).reshape(-1, len(names))
+        return {dimension: totals[:, position] for position, dimension in enumerate(names)}
+
+    slow, slow_seconds = timed(per_entry)
+    fast, fast_seconds = timed(vectorized)
+    same = all(slow.get((name, dimension), 0) == int(total) for dimension, totals in fast.items()
+               for name, total in zip(columns.products.names, totals))
+    print(f"{count} purchases, totals per product and dimension in base units (same result: {same})")
+    print(f"per entry   {slow_seconds * 1000:8.1f} ms")
+    print(f"vectorized  {fast_seconds * 1000:8.1f} ms")
+
+
+#benchmark: time of one script rerun of main.py per page, for a logged-in flat with some history
+def bench_reruns(runs=5, app_dir=None):
+    from streamlit.testing.v1 import AppTest
+
+    app_dir = os.path.abspath(app_dir or os.path.dirname(os.path.abspath(__file__)))
+    workdir = tempfile.mkdtemp() #the flat's files are written here, not into the repository
+    cwd = os.getcwd()
+    os.environ["WASTELESS_ML_WARMUP"] = "0"
+    sys.path.insert(0, app_dir)
+    mates = ["Livio", "Flurin", "Anderin"]
+    purchases = {mate: [{"Product": f"product {i % 40}", "Quantity": 1.0, "Price": 2.5, "Unit": "Pieces",
+                         "Date": f"2024-12-{1 + i % 28:02d} 12:00:00"} for i in range(500)] for mate in mates}
+    try:
+        os.chdir(workdir)
+        for page in ["overview", "inventory", "scan", "recipes", "settings"]:
+            app = AppTest.from_file(os.path.join(app_dir, "main.py"), default_timeout=120)
+            app.session_state["logged_in"] = True
+            app.session_state["username"] = "bench flat"
+            app.session_state["page"] = page
+            app.session_state["flate_name"] = "bench flat"
+            app.session_state["setup_finished"] = True
+            app.session_state["roommates"] = list(mates)
+            app.session_state["expenses"] = {mate: 1250.0 for mate in mates}
+            app.session_state["purchases"] = purchases
+            app.session_state["consumed"] = {mate: [] for mate in mates}
+            app.session_state["inventory"] = {f"product {i}": {"Quantity": 2.0, "Unit": "Pieces", "Price": 5.0} for i in range(40)}
+            _, first = timed(app.run) #first run: imports, model index, cache misses
+            if app.exception:
+                print(f"{page}: {app.exception[0].message}")
+            timings = [timed(app.run)[1] for _ in range(runs)]
+            print(f"{page:10s} first run {first * 1000:8.1f} ms   rerun {min(timings) * 1000:8.1f} ms (best of {runs})")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+BENCHMARKS = {
+    "users": bench_user_directory,
+    "models": bench_model_loading,
+    "startup": bench_startup,
+    "barcodes": bench_barcode_decoding,
+    "history": bench_history,
+    "reruns": bench_reruns,
+    "expiry": bench_expiry,
+    "units": bench_units,
+}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        print(f"usage: python benchmarks.py [{'|'.join(BENCHMARKS)}] [size]")
+    else:
+        size = [int(sys.argv[2])] if len(sys.argv) > 2 else []
+        BENCHMARKS[sys.argv[1]](*size)
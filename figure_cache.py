@@ -0,0 +1,62 @@
+import os
+import threading
+from collections import OrderedDict
+
+#process-wide cache of the overview's plotly figures, shared by all sessions
+#a figure is stored under (flat, data version, chart name): the data version is the flat's event log position
+#(log_seq), which changes with every saved change, so a cached figure can never show old data
+#least recently used figures are dropped when the cache is over its memory budget (WASTELESS_FIGURE_CACHE_MB)
+
+BUDGET_BYTES = int(float(os.environ.get("WASTELESS_FIGURE_CACHE_MB", "64")) * 1e6)
+
+_figures = OrderedDict() #key -> (figure, size in bytes), least recently used first
+_size = 0
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+#function to store a figure in serialized form: the figure is rebuilt from its json, its data arrays are then already
+#encoded and st.plotly_chart converts it about 10x faster than a fresh plotly express figure
+def _serialized(figure):
+    if figure is None: #"no data" is cached too
+        return None, 100
+    import plotly.io as pio
+    text = figure.to_json()
+    return pio.from_json(text), len(text) #the json size is about what the figure holds in memory
+
+
+#function to get a figure from the cache or build it (build returns a figure or None when there is no data)
+def cached(flat, version, name, build):
+    global _size
+    if flat is None or version is None: #not logged in: nothing identifies the data
+        return build()
+    key = (flat, version, name)
+    with _lock:
+        if key in _figures:
+            _figures.move_to_end(key)
+            _stats["hits"] += 1
+            return _figures[key][0]
+        _stats["misses"] += 1
+    figure, size = _serialized(build()) #outside the lock, other sessions don't wait for this chart
+    with _lock:
+        if key not in _figures and size <= BUDGET_BYTES:
+            _figures[key] = (figure, size)
+            _size += size
+            while _size > BUDGET_BYTES: #drop the least recently used figures
+                _, (_, dropped) = _figures.popitem(last=False)
+                _size -= dropped
+                _stats["evictions"] += 1
+    return figure
+
+
+#function to forget all figures of a flat (e.g. when the account is deleted, its log positions start again at 0)
+def invalidate(flat):
+    global _size
+    with _lock:
+        for key in [key for key in _figures if key[0] == flat]:
+            _size -= _figures.pop(key)[1]
+
+
+def stats():
+    with _lock:
+        return dict(_stats, figures=len(_figures), bytes=_size)
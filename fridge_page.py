@@ -1,87 +1,31 @@
 import streamlit as st 
 import pandas as pd 
-from datetime import datetime #timestamps for purchases & consumption
-
-#initialization of the session status for saving values between interactions, just for testing
-if "roommates" not in st.session_state:
-    st.session_state["roommates"] = ["Livio", "Flurin", "Anderin"] #default roommates for testing
-if "inventory" not in st.session_state: 
-    st.session_state["inventory"] = {} #dictionary to store inventory data
-if "expenses" not in st.session_state:
-    st.session_state["expenses"] = {mate: 0.0 for mate in st.session_state["roommates"]}#track total expenses (each roommate)
-if "purchases" not in st.session_state:
-    st.session_state["purchases"] = {mate: [] for mate in st.session_state["roommates"]} #keep record purchases (each roomate)
-if "consumed" not in st.session_state:
-    st.session_state["consumed"] = {mate: [] for mate in st.session_state["roommates"]} #keep record consumed items
-
-#makes sure expenses, purchases and consumption entries are initialized when adding or removing roommates
-def ensure_roommate_entries():
-    for mate in st.session_state["roommates"]:
-        if mate not in st.session_state["expenses"]: #add missing expense entry
-            st.session_state["expenses"][mate] = 0.0
-        if mate not in st.session_state["purchases"]: #add missing purchase
-            st.session_state["purchases"][mate] = []
-        if mate not in st.session_state["consumed"]: #add missing consumption
-            st.session_state["consumed"][mate] = []
+import units #unit names the inventory can convert
+import inventory #inventory, expenses and history are changed together there
+import history_store #columnar history and overview totals
+import history_view #paged history tables
 
 #function to remove product from inventory
-def delete_product_from_inventory(food_item, quantity, unit, selected_roommate):
-    ensure_roommate_entries() #make sure all roommates data is initialized
-    delete_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S") #get current time
-    
-    if food_item and quantity > 0 and selected_roommate: #check if input valid
-        if food_item in st.session_state["inventory"]: #chekc if fooditems exist in inventory
-            current_quantity = st.session_state["inventory"][food_item]["Quantity"] #qt quantity fo item
-            current_price = st.session_state["inventory"][food_item]["Price"] #get total price
-            if quantity <= current_quantity: #check if there is enough quanity to remove
-                #calculate price
-                price_per_unit = current_price / current_quantity if current_quantity > 0 else 0
-                amount_to_deduct = price_per_unit * quantity # calculate price to deduct
-                #update inventory
-                st.session_state["inventory"][food_item]["Quantity"] -= quantity
-                st.session_state["inventory"][food_item]["Price"] -= amount_to_deduct #update price
-                st.session_state["expenses"][selected_roommate] -= amount_to_deduct #deduct from roommates expenses
-                st.success(f"'{quantity}' of '{food_item}' has been removed.") #return success message
-                st.session_state["consumed"][selected_roommate].append({ #report ingredients consumed
-                    "Product": food_item,
-                    "Quantity": quantity,
-                    "Price": amount_to_deduct,
-                    "Unit": unit,
-                    "Date": delete_time
-                })
-                # Remove item if quantity reaches zero
-                if st.session_state["inventory"][food_item]["Quantity"] <= 0: #if quantitiy is 0 -> remove item
-                    del st.session_state["inventory"][food_item]
-            else:
-                st.warning("The quantity to remove exceeds the available quantity.") #warn if quantity is too high. Cannot remove more than we have
-        else:
-            st.warning("This item is not in the inventory.") #warn if item not in inventory
-    else:
-        st.warning("Please fill in all fields.") #warning message when fileds empty
+def delete_product_from_inventory(food_item, quantity, selected_roommate, order="expiry"):
+    try:
+        inventory.remove_items(st.session_state, selected_roommate, [(food_item, quantity)], order=order) #inventory, expenses and history together
+    except ValueError as error: #unknown product, too much or empty fields -> nothing was changed
+        st.warning(str(error))
+        return
+    st.success(f"'{quantity}' of '{food_item}' has been removed.") #return success message
 
 #function to add product to inventory
-def add_product_to_inventory(food_item, quantity, unit, price, selected_roommate):
-    ensure_roommate_entries() #makes sure roomate date is ready
-    purchase_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S") #get current time
-    if food_item in st.session_state["inventory"]:  # checks if the food is already in the inventory
-        st.session_state["inventory"][food_item]["Quantity"] += quantity #add to quantity
-        st.session_state["inventory"][food_item]["Price"] += price #add to total price
-    else:
-        st.session_state["inventory"][food_item] = {"Quantity": quantity, "Unit": unit, "Price": price} #add new item
-    
-    st.session_state["expenses"][selected_roommate] += price #add to roomates expenses
-    st.session_state["purchases"][selected_roommate].append({ #save the purchase
-        "Product": food_item,
-        "Quantity": quantity,
-        "Price": price,
-        "Unit": unit,
-        "Date": purchase_time
-    })
+def add_product_to_inventory(food_item, quantity, unit, price, selected_roommate, expiry=None):
+    try:
+        inventory.add_items(st.session_state, selected_roommate, [(food_item, quantity, unit, price, expiry)]) #inventory, expenses and history together
+    except ValueError as error: #e.g. pieces of a product that is stored in liters -> nothing was changed
+        st.warning(str(error))
+        return
     st.success(f"'{food_item}' has been added to the inventory, and {selected_roommate}'s expenses were updated.") #show succesful message
 
 #main page function to manage fridge
 def fridge_page():
-    ensure_roommate_entries() #make sure roommates data is initialized
+    inventory.ensure_roommates(st.session_state) #make sure roommates data is initialized
     st.title("Inventory")  # show the page title
 
     #roommate selection
@@ -110,30 +54,36 @@ def fridge_page():
             'bread', 'parsley'
         ])
         quantity = st.number_input("Quantity:", min_value=0.0) #input quantity
-        unit = st.selectbox("Unit:", ["Pieces", "Liters", "Grams"]) #option to choose unit (dropdown)
+        unit = st.selectbox("Unit:", units.CHOICES) #option to choose unit (dropdown)
         price = st.number_input("Price (in CHF):", min_value=0.0) #input price
+        expiry = st.date_input("Best before (optional):", value=None) #each purchase keeps its own expiry date
         
         if st.button("Add item"): #button to confirm adding item
             if food_item and quantity > 0 and price >= 0 and selected_roommate: #check if fields are filled
-                add_product_to_inventory(food_item, quantity, unit, price, selected_roommate) #call function
+                add_product_to_inventory(food_item, quantity, unit, price, selected_roommate, expiry) #call function
             else:
                 st.warning("Please fill in all fields.") #warning if filed not all filled
     
     elif action == "Remove": #show input fields for removing an item, if "Remove" selected
-        if st.session_state["inventory"]:#check if invetory is not empty
-            food_item = st.selectbox("Select a food item to remove:", list(st.session_state["inventory"].keys())) #dropdown to seelct item to remove
+        if inventory.products(st.session_state):#check if invetory is not empty
+            food_item = st.selectbox("Select a food item to remove:", inventory.products(st.session_state)) #dropdown to seelct item to remove
             quantity = st.number_input("Quantity to remove:", min_value=1.0, step=1.0) #input quantity to remove
-            unit = st.session_state["inventory"][food_item]["Unit"] #get unit
+            order = st.radio("Take first:", ["Earliest best before date", "Oldest purchase"], horizontal=True) #which lots are used up
             if st.button("Remove item"): #button to confirm removing item
-                delete_product_from_inventory(food_item, quantity, unit, selected_roommate) #if button clicked call delet function
+                delete_product_from_inventory(food_item, quantity, selected_roommate, #if button clicked call delet function
+                                              "expiry" if order == "Earliest best before date" else "fifo")
         else:
             st.warning("The inventory is empty.") #warning if inventory empty
 
+    #warn about food that goes off soon
+    expiring = inventory.expiring_soon(st.session_state, days=3)
+    if expiring:
+        st.warning("Use soon: " + ", ".join(f"{lot.product} ({lot.quantity:g} {lot.unit}, best before {lot.expiry})" for lot in expiring))
+
     #show inventory
     if st.session_state["inventory"]: #check if invetory exist
         st.write("Current Inventory:") #show inventory title
-        inventory_df = pd.DataFrame.from_dict(st.session_state["inventory"], orient='index') #convert inventory to dataframe
-        inventory_df = inventory_df.reset_index().rename(columns={'index': 'Food Item'}) #move food item to the second column and rename -> better readabilty
+        inventory_df = pd.DataFrame(inventory.items(st.session_state), columns=["Food Item", "Quantity", "Unit", "Price", "Best before"]) #one row per product, earliest expiry of its lots
         st.table(inventory_df)
     else:
         st.write("The inventory is empty.") #show message if inventory empty
@@ -145,14 +95,32 @@ def fridge_page():
 
     #show purchases and consumed items (for each per roommate)
     st.write("Purchases and Consumptions per roommate:") #show title
-    for mate in st.session_state["roommates"]: #go thtrough roommates
-        st.write(f"{mate}'s Purchases:")# title for purchases of individual roommate
-        purchases_df = pd.DataFrame(st.session_state["purchases"][mate]) #convert purchase to dataframe
-        st.table(purchases_df) #show purchase as a table
-        
-        st.write(f"{mate}'s Consumptions:") #show title fpr consumtions of specific roommate
-        consumed_df = pd.DataFrame(st.session_state["consumed"][mate]) #convert consumtions to dataframe
-        st.table(consumed_df) #show consumtions as a table
+    start, end = history_view.date_range_filter("fridge_history_range") #only this period is shown
+    mate = st.selectbox("Roommate:", ["All roommates"] + st.session_state["roommates"], key="fridge_history_mate")
+    mate = None if mate == "All roommates" else mate
+    st.write("Purchases:") #title for purchases
+    history_view.history_table("purchases", mate, start, end, "fridge_purchases") #one page of the history
+    st.write("Consumptions:") #title for consumptions
+    history_view.history_table("consumed", mate, start, end, "fridge_consumed")
+    purchases = history_store.get_columns(st.session_state, "purchases") #columnar history, built once per login
+    consumed = history_store.get_columns(st.session_state, "consumed")
+
+    #export the whole history as csv: the files are only built when a button is clicked, and clicking doesn't rerun the page
+    st.download_button("Download purchases as CSV", lambda: purchases.frame(with_mate=True).to_csv(index=False),
+                       file_name="purchases.csv", mime="text/csv", on_click="ignore")
+    st.download_button("Download consumptions as CSV", lambda: consumed.frame(with_mate=True).to_csv(index=False),
+                       file_name="consumptions.csv", mime="text/csv", on_click="ignore")
 
-#call function to display fridge page
-fridge_page()
+#run this page on its own for testing with example roommates: streamlit run fridge_page.py
+if __name__ == "__main__":
+    if "roommates" not in st.session_state:
+        st.session_state["roommates"] = ["Livio", "Flurin", "Anderin"] #default roommates for testing
+    if "inventory" not in st.session_state: 
+        st.session_state["inventory"] = {} #dictionary to store inventory data
+    if "expenses" not in st.session_state:
+        st.session_state["expenses"] = {mate: 0.0 for mate in st.session_state["roommates"]}#track total expenses (each roommate)
+    if "purchases" not in st.session_state:
+        st.session_state["purchases"] = {mate: [] for mate in st.session_state["roommates"]} #keep record purchases (each roomate)
+    if "consumed" not in st.session_state:
+        st.session_state["consumed"] = {mate: [] for mate in st.session_state["roommates"]} #keep record consumed items
+    fridge_page()
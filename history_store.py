@@ -0,0 +1,191 @@
+import numpy as np
+
+import overview_rollups
+import units #base units for quantity sums
+
+#columnar copy of the purchase and consumption history for fast scans, tables and exports
+#one typed array per field: roommate/product/unit as interned integer ids, quantity and price as float64,
+#time as int64 seconds since 1970 (the app's local time, like the date strings)
+#the lists of dicts in the session stay what is saved; this copy is built once per login and then appended to
+
+HISTORY_KEYS = overview_rollups.HISTORY_KEYS
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+DEFAULT_DATE = "1900-01-01 00:00:00" #entries without a readable date
+
+
+#names -> small integer ids, so each row stores a number instead of a string
+class Interner:
+    def __init__(self):
+        self.names = []
+        self.ids = {}
+
+    def id(self, name):
+        found = self.ids.get(name)
+        if found is None:
+            found = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return found
+
+
+class HistoryColumns:
+    FIELDS = {"mate": np.int32, "product": np.int32, "unit": np.int16, "quantity": np.float64, "price": np.float64, "time": np.int64}
+
+    def __init__(self, capacity=1024):
+        self.size = 0
+        self.arrays = {field: np.zeros(capacity, dtype) for field, dtype in self.FIELDS.items()}
+        self.mates = Interner()
+        self.products = Interner()
+        self.units = Interner()
+        self.time_sorted = True #entries arrive in time order, which allows binary search on time
+
+    def __len__(self):
+        return self.size
+
+    def column(self, field):
+        return self.arrays[field][:self.size] #a view, no copy
+
+    def _reserve(self, extra):
+        if self.size + extra > len(self.arrays["time"]): #grow by doubling -> appends are amortized O(1)
+            capacity = max(self.size + extra, 2 * len(self.arrays["time"]))
+            for field, array in self.arrays.items():
+                grown = np.zeros(capacity, array.dtype)
+                grown[:self.size] = array[:self.size]
+                self.arrays[field] = grown
+
+    def append(self, mate, entry):
+        self._reserve(1)
+        row = self.size
+        self.arrays["mate"][row] = self.mates.id(mate)
+        self.arrays["product"][row] = self.products.id(entry.get("Product"))
+        self.arrays["unit"][row] = self.units.id(entry.get("Unit"))
+        self.arrays["quantity"][row] = entry.get("Quantity") or 0
+        self.arrays["price"][row] = entry.get("Price") or 0
+        self.arrays["time"][row] = to_seconds([entry.get("Date")])[0]
+        if row and self.arrays["time"][row] < self.arrays["time"][row - 1]:
+            self.time_sorted = False
+        self.size += 1
+
+    def extend(self, mate, entries):
+        """Append many entries of one roommate at once (vectorized date parsing)"""
+        count = len(entries)
+        if not count:
+            return
+        self._reserve(count)
+        rows = slice(self.size, self.size + count)
+        self.arrays["mate"][rows] = self.mates.id(mate)
+        self.arrays["product"][rows] = [self.products.id(entry.get("Product")) for entry in entries]
+        self.arrays["unit"][rows] = [self.units.id(entry.get("Unit")) for entry in entries]
+        self.arrays["quantity"][rows] = [entry.get("Quantity") or 0 for entry in entries]
+        self.arrays["price"][rows] = [entry.get("Price") or 0 for entry in entries]
+        self.arrays["time"][rows] = to_seconds([entry.get("Date") for entry in entries])
+        self.size += count
+        times = self.column("time")
+        self.time_sorted = bool(np.all(times[1:] >= times[:-1]))
+
+    def sort_by_time(self):
+        order = np.argsort(self.column("time"), kind="stable")
+        for field, array in self.arrays.items():
+            array[:self.size] = array[:self.size][order]
+        self.time_sorted = True
+
+    def select(self, mate=None, start=None, end=None):
+        """Row numbers of one roommate (or all) with start <= time < end (seconds, None = open)"""
+        times = self.column("time")
+        if self.time_sorted: #binary search instead of comparing every row
+            low = 0 if start is None else int(np.searchsorted(times, start, "left"))
+            high = self.size if end is None else int(np.searchsorted(times, end, "left"))
+            rows = np.arange(low, high)
+        else:
+            keep = np.ones(self.size, bool)
+            if start is not None:
+                keep &= times >= start
+            if end is not None:
+                keep &= times < end
+            rows = np.flatnonzero(keep)
+        if mate is not None:
+            mate_id = self.mates.ids.get(mate)
+            if mate_id is None:
+                return rows[:0]
+            rows = rows[self.column("mate")[rows] == mate_id]
+        return rows
+
+    def totals_by(self, field, rows=None, value="price"):
+        """Sum of value per name of field ("mate", "product" or "unit"): {name: total}"""
+        keys = self.column(field) if rows is None else self.column(field)[rows]
+        values = self.column(value) if rows is None else self.column(value)[rows]
+        names = {"mate": self.mates, "product": self.products, "unit": self.units}[field].names
+        sums = np.bincount(keys, weights=values, minlength=len(names))
+        return {name: float(total) for name, total in zip(names, sums) if total}
+
+    def base_quantities(self, rows=None):
+        """Quantities in integer base units of their unit (mg, microliters, thousandths of a piece), -1 if the unit is unknown"""
+        per_unit = units.factors(self.units.names) #one registry lookup per distinct unit, then one multiplication
+        unit_ids = self.column("unit") if rows is None else self.column("unit")[rows]
+        quantities = self.column("quantity") if rows is None else self.column("quantity")[rows]
+        per_row = per_unit[unit_ids] if len(per_unit) else np.zeros(len(unit_ids), np.int64)
+        return np.where(per_row < 0, -1, np.rint(quantities * per_row).astype(np.int64))
+
+    def frame(self, rows=None, with_mate=False):
+        """pandas table of the rows in the app's column names (dates as text again)"""
+        import pandas as pd
+        rows = np.arange(self.size) if rows is None else rows
+        table = {
+            "Product": np.array(self.products.names, dtype=object)[self.column("product")[rows]] if self.products.names else [],
+            "Quantity": self.column("quantity")[rows],
+            "Price": self.column("price")[rows],
+            "Unit": np.array(self.units.names, dtype=object)[self.column("unit")[rows]] if self.units.names else [],
+            "Date": to_text(self.column("time")[rows]),
+        }
+        if with_mate:
+            table = {"Roommate": np.array(self.mates.names, dtype=object)[self.column("mate")[rows]] if self.mates.names else [], **table}
+        return pd.DataFrame(table)
+
+    def page(self, mate=None, start=None, end=None, number=1, size=50):
+        """One page of the rows in the time range, newest first: (table, number of matching rows)"""
+        rows = self.select(mate, start, end)
+        window = rows[::-1][(number - 1) * size:number * size] #only the visible rows are turned into a table
+        return self.frame(window, with_mate=mate is None), len(rows)
+
+    def nbytes(self):
+        return sum(array[:self.size].nbytes for array in self.arrays.values())
+
+
+#functions to convert date strings <-> seconds, for whole arrays at once
+def to_seconds(dates):
+    import pandas as pd
+    parsed = pd.to_datetime(pd.Series(dates, dtype=object), format=DATE_FORMAT, errors="coerce")
+    parsed = parsed.fillna(pd.Timestamp(DEFAULT_DATE))
+    return parsed.to_numpy(dtype="datetime64[s]").astype(np.int64)
+
+
+def to_text(seconds):
+    import pandas as pd
+    return pd.to_datetime(np.asarray(seconds, dtype="datetime64[s]")).strftime(DATE_FORMAT).to_numpy(dtype=object)
+
+
+#function to build the columns from the session's lists
+def build(history):
+    columns = HistoryColumns(capacity=max(sum(len(entries) for entries in history.values()), 1024))
+    for mate, entries in history.items():
+        columns.extend(mate, entries)
+    columns.sort_by_time() #roommates' entries mixed in time order -> time ranges by binary search
+    return columns
+
+
+#function to get up to date columns for "purchases" or "consumed" (rebuilt after login or a merge, like the rollups)
+def get_columns(state, key):
+    stored = state.get("history_columns", {}).get(key)
+    if stored is None or not overview_rollups.same_sources(stored[0], state, key): #same check as the rollups
+        stored = (overview_rollups.sources(state, key), build(state.get(key, {})))
+        state.setdefault("history_columns", {})[key] = stored
+    return stored[1]
+
+
+#function to call right after appending an entry to state[key][mate]: updates the columns and the overview totals
+def record(state, key, mate, entry):
+    stored = state.get("history_columns", {}).get(key)
+    entries = state[key][mate]
+    if stored is not None and overview_rollups.appended_one(stored[0], mate, entries):
+        stored[1].append(mate, entry)
+        stored[0][mate] = (entries, len(entries))
+    overview_rollups.record(state, key, mate, entry)
@@ -0,0 +1,43 @@
+import math
+from datetime import date, timedelta
+
+import streamlit as st
+
+import history_store
+
+#history tables for the fridge and barcode pages: date range filter and pages, so only the visible rows are built
+#the rows come from the columnar history (history_store), the table is a scrollable st.dataframe
+
+PAGE_SIZES = [25, 50, 100]
+
+
+def _seconds(day):
+    return (day - date(1970, 1, 1)).days * 86400 #same clock as the stored dates
+
+
+#function to let the user choose the period, returns (start, end) in seconds, end excluded
+def date_range_filter(widget_key, days=30):
+    today = date.today()
+    chosen = st.date_input("Show history from - to:", value=(today - timedelta(days=days), today), key=widget_key)
+    if not isinstance(chosen, (tuple, list)): #older streamlit versions return a single date
+        chosen = (chosen,)
+    start = _seconds(chosen[0]) if chosen else None
+    end = _seconds(chosen[1] + timedelta(days=1)) if len(chosen) == 2 else None #while only the first day is picked: open end
+    return start, end
+
+
+#function to show one page of the history of one roommate (or all roommates with mate=None)
+def history_table(key, mate, start, end, widget_key):
+    columns = history_store.get_columns(st.session_state, key)
+    size = st.session_state.get(f"{widget_key}_size", PAGE_SIZES[0])
+    total = len(columns.select(mate, start, end))
+    if not total:
+        st.write("No entries in this period.")
+        return
+    pages = math.ceil(total / size)
+    number = st.number_input(f"Page (of {pages}):", min_value=1, max_value=pages, value=1, key=f"{widget_key}_page") if pages > 1 else 1
+    table, total = columns.page(mate, start, end, number, size)
+    st.dataframe(table, hide_index=True, width="stretch")
+    first = (number - 1) * size + 1
+    st.caption(f"Entries {first}-{first + len(table) - 1} of {total}, newest first")
+    st.selectbox("Rows per page:", PAGE_SIZES, key=f"{widget_key}_size")
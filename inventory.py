@@ -0,0 +1,265 @@
+import heapq
+import itertools
+import uuid
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+import history_store #columnar history and overview totals
+import storage_log #lots are saved as changes per lot id
+import units #quantities are added and subtracted in integer base units
+from recipe_index import normalize #"Onions" and "onion" are the same product
+
+#the fridge of a flat: all pages add and remove products through this module
+#st.session_state["inventory"] stays what is saved ({product: {"Quantity", "Unit", "Price"}}), this module keeps
+#an index normalized name -> stored name next to it, so "Onions" finds "onion" in O(1) instead of making a second entry
+#add_items/remove_items take many products at once and update inventory, expenses and history in one pass;
+#everything is checked first, so a batch is either applied completely or not at all
+#every purchase is kept as a lot with its own price and expiry date ({..., "Lots": [{"Id", "Quantity", "Price", "Bought",
+#"Expiry"}]}, Quantity and Price stay the totals and the lots add up to them); consumption takes the lots that expire first (or the oldest, "fifo")
+#a heap of the lots by expiry date answers "what expires in the next days" without looking at the whole fridge
+#quantities are stored in the product's unit but all arithmetic is done in integer base units (units.py), so a
+#product bought in grams and in kilograms adds up correctly and nothing is left over from rounding
+
+Item = namedtuple("Item", ["product", "quantity", "unit", "price", "expiry"], defaults=[None]) #price = total value, expiry = earliest
+Lot = namedtuple("Lot", ["product", "quantity", "unit", "price", "bought", "expiry"])
+DAY_FORMAT = "%Y-%m-%d"
+FREE_FORM_FACTOR = units.FREE_FORM_FACTOR #base units per unit for unit names the registry doesn't know
+
+#order in which lots are consumed: earliest expiry first (lots without a date last) or oldest purchase first
+CONSUME_ORDERS = {
+    "expiry": lambda lot: (lot["Expiry"] is None, lot["Expiry"] or "", lot["Bought"] or ""),
+    "fifo": lambda lot: lot["Bought"] or "",
+}
+
+
+#makes sure expenses, purchases and consumption entries exist for every roommate
+def ensure_roommates(state):
+    for key, empty in (("expenses", float), ("purchases", list), ("consumed", list)):
+        entries = state.setdefault(key, {})
+        for mate in state.get("roommates", []):
+            if mate not in entries:
+                entries[mate] = empty()
+
+
+def _index(state):
+    #rebuilt when the inventory dict was replaced (login, merge with another session) or changed elsewhere
+    inventory = state.setdefault("inventory", {})
+    index = state.get("inventory_index")
+    if index is None or index["source"] is not inventory or index["size"] != len(inventory):
+        counter = itertools.count() #tie breaker, lots themselves can't be compared
+        expiry = [(lot["Expiry"], next(counter), name, lot) for name, stored in inventory.items() for lot in _lots(stored) if lot["Expiry"]]
+        heapq.heapify(expiry) #O(n) once per login, then O(log n) per new lot
+        #the index holds the dict itself: a new dict that gets the address of a freed one is never taken for it
+        index = {"source": inventory, "size": len(inventory), "names": {normalize(name): name for name in inventory},
+                 "expiry": expiry, "counter": counter}
+        state["inventory_index"] = index
+    return index
+
+
+def _lots(stored):
+    return storage_log.item_lots(stored) #products saved before lots existed become one lot without dates
+
+
+def _day(value):
+    if value is None or value == "":
+        return None
+    if isinstance(value, (date, datetime)):
+        return value.strftime(DAY_FORMAT)
+    return str(value)[:10] #"2024-12-01" or "2024-12-01 18:30:00"
+
+
+def _earliest(stored):
+    return min((lot["Expiry"] for lot in _lots(stored) if lot["Expiry"]), default=None)
+
+
+#functions to convert between a quantity and integer base units of the product's stored unit
+def _to_base(quantity, unit, stored_unit, product):
+    if unit == stored_unit and not units.is_known(unit): #free-form unit from older data
+        return int(round(quantity * FREE_FORM_FACTOR))
+    return units.to_base_of(quantity, unit, stored_unit, product) #ValueError if the units don't fit
+
+
+def _from_base(amount, stored_unit):
+    return amount / units.base_factor(stored_unit)
+
+
+def _update_source(state):
+    state["inventory_index"]["size"] = len(state["inventory"])
+
+
+#function to find the stored name of a product ("Onions" -> "onion"), None if it is not in the fridge
+def lookup(state, product):
+    name = _index(state)["names"].get(normalize(product))
+    return name if name in state["inventory"] else None
+
+
+def get(state, product):
+    name = lookup(state, product)
+    if name is None:
+        return None
+    values = state["inventory"][name]
+    return Item(name, values["Quantity"], values["Unit"], values["Price"], _earliest(values))
+
+
+def products(state):
+    return list(state.get("inventory", {}))
+
+
+def items(state):
+    return [Item(name, values["Quantity"], values["Unit"], values["Price"], _earliest(values)) for name, values in state.get("inventory", {}).items()]
+
+
+def lots(state, product):
+    """Lots of a product in the order they are consumed"""
+    name = lookup(state, product)
+    if name is None:
+        return []
+    stored = state["inventory"][name]
+    return [Lot(name, lot["Quantity"], stored["Unit"], lot["Price"], lot["Bought"], lot["Expiry"])
+            for lot in sorted(_lots(stored), key=CONSUME_ORDERS["expiry"])]
+
+
+#function to list the lots that expire within the next days (already expired ones included), earliest first
+def expiring_soon(state, days=3, today=None):
+    """O(k log k) for k matching lots: only the part of the heap above the date is visited, nothing is popped"""
+    until = ((today or date.today()) + timedelta(days=days)).strftime(DAY_FORMAT)
+    index = _index(state)
+    heap = index["expiry"]
+    found = []
+    stale = 0
+    positions = [0]
+    while positions: #children of a heap entry are never earlier, so a branch past the date is skipped completely
+        position = positions.pop()
+        if position < len(heap) and heap[position][0] <= until:
+            if heap[position][3]["Quantity"] > 0:
+                found.append(heap[position])
+            else: #used up lot, it stays in the heap until the next clean up
+                stale += 1
+            positions += [2 * position + 1, 2 * position + 2]
+    if stale and stale * 2 > len(found): #mostly used up lots near the top -> clean up once, O(n)
+        heap[:] = [entry for entry in heap if entry[3]["Quantity"] > 0]
+        heapq.heapify(heap)
+    inventory = state["inventory"]
+    return [Lot(name, lot["Quantity"], inventory[name]["Unit"], lot["Price"], lot["Bought"], expiry)
+            for expiry, _, name, lot in sorted(found, key=lambda entry: entry[:2])]
+
+
+def _now():
+    return datetime.now().strftime(history_store.DATE_FORMAT)
+
+
+#function to add purchased products of one roommate: items are Items or (product, quantity, unit, price[, expiry])
+def add_items(state, mate, new_items, when=None):
+    """Add the products to the inventory, the roommate's expenses and purchases; returns the purchase entries"""
+    new_items = [Item(*item) for item in new_items]
+    index = _index(state)
+    stored_units = {} #normalized name -> unit the product is (or will be) stored in
+    amounts = [] #quantity of each item in base units of its product's unit
+    for item in new_items: #check the whole batch before changing anything
+        if not item.product or not item.quantity or item.quantity <= 0 or item.price is None or item.price < 0:
+            raise ValueError(f"Please fill in product, quantity and price for '{item.product or ''}'.")
+        key = normalize(item.product)
+        name = index["names"].get(key, item.product)
+        stored_unit = stored_units.setdefault(key, state["inventory"][name]["Unit"] if name in state["inventory"] else item.unit)
+        amounts.append(_to_base(item.quantity, item.unit, stored_unit, name)) #e.g. 500 grams of milk stored in liters
+    ensure_roommates(state)
+    inventory = state["inventory"]
+    when = when or _now()
+    entries = []
+    for item, amount in zip(new_items, amounts):
+        name = index["names"].setdefault(normalize(item.product), item.product) #an existing product keeps its spelling
+        stored = inventory.setdefault(name, {"Quantity": 0, "Unit": item.unit, "Price": 0, "Lots": []})
+        expiry = _day(item.expiry)
+        lot = {"Id": uuid.uuid4().hex[:12], "Quantity": _from_base(amount, stored["Unit"]), "Price": item.price,
+               "Bought": when, "Expiry": expiry} #one lot per purchase
+        _lots(stored).append(lot)
+        stored["Quantity"] = _from_base(_to_base(stored["Quantity"], stored["Unit"], stored["Unit"], name) + amount, stored["Unit"])
+        stored["Price"] += item.price
+        if expiry:
+            heapq.heappush(index["expiry"], (expiry, next(index["counter"]), name, lot))
+        entry = {"Product": name, "Quantity": item.quantity, "Price": item.price, "Unit": item.unit, "Date": when} #as bought
+        state["purchases"][mate].append(entry)
+        history_store.record(state, "purchases", mate, entry) #keep the columnar history and overview totals up to date
+        entries.append(entry)
+    state["expenses"][mate] += sum(item.price for item in new_items)
+    _update_source(state)
+    return entries
+
+
+#function to turn a removal (product, quantity[, unit]) into (stored name, base units), unit defaults to the stored one
+def _removal(state, removal):
+    product, quantity, unit = (tuple(removal) + (None,))[:3]
+    name = lookup(state, product) if product else None
+    if not product or not quantity or quantity <= 0:
+        raise ValueError("Please fill in all fields.")
+    if name is None:
+        raise ValueError(f"'{product}' is not in the inventory.")
+    stored_unit = state["inventory"][name]["Unit"]
+    return name, _to_base(quantity, unit or stored_unit, stored_unit, name)
+
+
+#function to find what is wrong with a removal: items are (product, quantity[, unit]), returns a list of messages
+def check_removal(state, removals):
+    problems = []
+    wanted = {} #stored name -> base units asked for, the same product can be in the batch twice
+    for removal in removals:
+        try:
+            name, amount = _removal(state, removal)
+        except ValueError as error:
+            problems.append(str(error))
+            continue
+        wanted[name] = wanted.get(name, 0) + amount
+    for name, amount in wanted.items():
+        stored = state["inventory"][name]
+        in_lots = sum(_to_base(lot["Quantity"], stored["Unit"], stored["Unit"], name) for lot in _lots(stored))
+        if amount > min(_to_base(stored["Quantity"], stored["Unit"], stored["Unit"], name), in_lots): #what the lots can give
+            problems.append(f"The quantity of '{name}' to remove exceeds the available quantity.")
+    return problems
+
+
+#function to take base units out of a product's lots: returns the value of what was taken
+def _take(name, stored, amount, order):
+    value = 0.0
+    for lot in sorted(_lots(stored), key=CONSUME_ORDERS[order]):
+        if amount <= 0:
+            break
+        available = _to_base(lot["Quantity"], stored["Unit"], stored["Unit"], name)
+        taken = min(amount, available)
+        price = lot["Price"] * taken / available if available > 0 else 0 #each lot at its own price
+        lot["Quantity"] = _from_base(available - taken, stored["Unit"])
+        lot["Price"] -= price
+        amount -= taken
+        value += price
+    stored["Lots"] = [lot for lot in stored["Lots"] if lot["Quantity"] > 0]
+    return value
+
+
+#function to remove consumed products of one roommate: items are (product, quantity[, unit])
+def remove_items(state, mate, removals, when=None, order="expiry"):
+    """Take the products out of the lots (order "expiry" or "fifo") and book them as consumed; returns the entries"""
+    removals = list(removals)
+    problems = check_removal(state, removals)
+    if problems:
+        raise ValueError(" ".join(problems))
+    ensure_roommates(state)
+    inventory = state["inventory"]
+    names = _index(state)["names"]
+    when = when or _now()
+    entries = []
+    for removal in removals:
+        name, amount = _removal(state, removal)
+        stored = inventory[name]
+        value = _take(name, stored, amount, order)
+        left = _to_base(stored["Quantity"], stored["Unit"], stored["Unit"], name) - amount
+        stored["Quantity"] = _from_base(left, stored["Unit"])
+        stored["Price"] -= value
+        state["expenses"][mate] -= value #what was eaten no longer counts as this roommate's stock
+        entry = {"Product": name, "Quantity": _from_base(amount, stored["Unit"]), "Price": value, "Unit": stored["Unit"], "Date": when}
+        state["consumed"][mate].append(entry)
+        history_store.record(state, "consumed", mate, entry)
+        entries.append(entry)
+        if left <= 0: #nothing left -> remove the product (its used up lots leave the heap lazily)
+            del inventory[name]
+            names.pop(normalize(name), None)
+    _update_source(state)
+    return entries
@@ -0,0 +1,220 @@
+import importlib
+import multiprocessing
+import os
+import pickle
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+#background jobs for heavy work (receipt OCR, bulk barcode scans): the streamlit script only submits and polls
+#jobs run in a pool of worker processes, their state is kept in a sqlite table so it survives reruns and restarts:
+#   job_id = submit("receipt", data, filename)  ->  status(job_id)  ->  result(job_id)   (or cancel / retry)
+#the number of worker processes is set with WASTELESS_JOB_WORKERS, the table file with WASTELESS_JOB_DB
+#see the jobs of this app with: python job_queue.py list
+
+JOB_FILE = os.environ.get("WASTELESS_JOB_DB", "jobs.db")
+WORKERS = int(os.environ.get("WASTELESS_JOB_WORKERS", "2"))
+KEEP_SECONDS = 7 * 24 * 3600 #finished jobs are deleted after a week
+
+#job kinds and the function that does the work (must be importable in a worker process, so no page modules)
+JOB_KINDS = {
+    "receipt": "receipt_ocr:read_receipt",
+    "bulk_scan": "barcode_scanner:scan_images",
+}
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+OWNER = f"{socket.gethostname()}:{os.getpid()}" #server process that started a job, only its pool can finish it
+
+_local = threading.local() #one sqlite connection per thread
+_pool = None
+_pool_lock = threading.Lock()
+_cleaned_up = False #jobs of stopped server processes are failed once per process
+_futures = {} #job id -> future of the jobs started by this process
+
+
+def _connection():
+    connection = getattr(_local, "connection", None)
+    if connection is None:
+        connection = sqlite3.connect(JOB_FILE, timeout=30)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("""CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, status TEXT NOT NULL, payload BLOB NOT NULL,
+            result BLOB, error TEXT, attempts INTEGER NOT NULL DEFAULT 1,
+            created REAL NOT NULL, started REAL, finished REAL, owner TEXT)""")
+        if "owner" not in [column[1] for column in connection.execute("PRAGMA table_info(jobs)")]: #table of an older version
+            connection.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+        _local.connection = connection
+    return connection
+
+
+def _alive(owner):
+    host, _, pid = (owner or "").rpartition(":")
+    if host != socket.gethostname(): #another machine (or an old row without owner): can't tell, only old rows are failed
+        return bool(owner)
+    try:
+        os.kill(int(pid), 0) #signal 0 only checks that the process exists
+    except ProcessLookupError:
+        return False
+    except (PermissionError, ValueError, OSError): #exists but belongs to another user, or can't be checked here
+        return True
+    return True
+
+
+#function to fail the jobs whose server process has stopped: they were waiting or running and will never finish
+def _clean_up():
+    global _cleaned_up
+    with _pool_lock:
+        if _cleaned_up:
+            return
+        _cleaned_up = True
+    db = _connection()
+    with db:
+        owners = [row[0] for row in db.execute("SELECT DISTINCT owner FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING))]
+        for owner in owners:
+            if owner != OWNER and not _alive(owner): #jobs of other running server processes are left alone
+                db.execute("UPDATE jobs SET status = ?, error = ?, finished = ? WHERE status IN (?, ?) AND owner IS ?",
+                           (FAILED, "interrupted by a restart", time.time(), QUEUED, RUNNING, owner))
+        db.execute("DELETE FROM jobs WHERE status IN (?, ?, ?) AND finished < ?", (*FINISHED, time.time() - KEEP_SECONDS))
+
+
+#function to get the worker processes (started on first use, started again after a crash; the jobs table isn't touched)
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            #forkserver/spawn: forking the multithreaded streamlit server is not safe
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _pool = ProcessPoolExecutor(max_workers=WORKERS, mp_context=multiprocessing.get_context(method))
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+#function that runs in the worker process
+def _run(job_id, attempt, kind, payload):
+    db = _connection()
+    with db:
+        started = db.execute("UPDATE jobs SET status = ?, started = ? WHERE id = ? AND attempts = ? AND status = ?",
+                             (RUNNING, time.time(), job_id, attempt, QUEUED)).rowcount
+    if not started: #cancelled while waiting (or retried, then the new attempt does the work)
+        return None
+    module_name, function_name = JOB_KINDS[kind].split(":")
+    function = getattr(importlib.import_module(module_name), function_name) #modules stay imported, models stay loaded
+    args, kwargs = pickle.loads(payload)
+    return pickle.dumps(function(*args, **kwargs))
+
+
+#function that runs in this process when a job is finished
+def _finished(job_id, attempt, future):
+    if _futures.get(job_id) is future:
+        del _futures[job_id]
+    db = _connection()
+    if future.cancelled():
+        values = (CANCELLED, None, None)
+    elif future.exception() is not None:
+        error = future.exception()
+        values = (FAILED, None, f"{type(error).__name__}: {error}")
+    else:
+        values = (DONE, future.result(), None)
+    #a job cancelled while running keeps the status cancelled, its result is thrown away; the outcome of an attempt
+    #that was cancelled and retried before it finished doesn't touch the row of the new attempt
+    with db:
+        db.execute("UPDATE jobs SET status = ?, result = ?, error = ?, finished = ? WHERE id = ? AND attempts = ? AND status IN (?, ?)",
+                   (*values, time.time(), job_id, attempt, QUEUED, RUNNING))
+
+
+def _start(job_id, attempt, kind, payload):
+    for restart in range(2):
+        try:
+            future = _get_pool().submit(_run, job_id, attempt, kind, payload)
+            break
+        except BrokenProcessPool: #a worker crashed (e.g. out of memory) -> start new workers once
+            if restart:
+                raise
+            _reset_pool()
+    _futures[job_id] = future
+    future.add_done_callback(lambda done: _finished(job_id, attempt, done))
+
+
+#function to start a job
+def submit(kind, *args, **kwargs):
+    """Queue a job and return its id"""
+    if kind not in JOB_KINDS:
+        raise ValueError(f"unknown job kind: {kind}")
+    payload = pickle.dumps((args, kwargs))
+    _clean_up() #first use fails the jobs of stopped server processes
+    db = _connection()
+    with db:
+        job_id = db.execute("INSERT INTO jobs (kind, status, payload, created, owner) VALUES (?, ?, ?, ?, ?)",
+                            (kind, QUEUED, payload, time.time(), OWNER)).lastrowid
+    _start(job_id, 1, kind, payload)
+    return job_id
+
+
+def status(job_id):
+    """Return {"id", "kind", "status", "error", "attempts", "created", "started", "finished", "waiting"} or None"""
+    row = _connection().execute(
+        "SELECT id, kind, status, error, attempts, created, started, finished FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    if row is None:
+        return None
+    job = dict(zip(("id", "kind", "status", "error", "attempts", "created", "started", "finished"), row))
+    if job["status"] == QUEUED: #position in the queue, to show the user
+        job["waiting"] = _connection().execute(
+            "SELECT COUNT(*) FROM jobs WHERE status = ? AND id < ?", (QUEUED, job_id)).fetchone()[0]
+    return job
+
+
+def result(job_id):
+    """Return the result of a finished job (None while it isn't done)"""
+    row = _connection().execute("SELECT status, result FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    if row is None or row[0] != DONE:
+        return None
+    return pickle.loads(row[1])
+
+
+def cancel(job_id):
+    """Cancel a waiting job; a running job finishes in the background but its result is discarded"""
+    db = _connection()
+    with db:
+        cancelled = db.execute("UPDATE jobs SET status = ?, finished = ? WHERE id = ? AND status IN (?, ?)",
+                               (CANCELLED, time.time(), job_id, QUEUED, RUNNING)).rowcount == 1
+    future = _futures.get(job_id)
+    if future is not None:
+        future.cancel() #only possible while it is still waiting for a worker
+    return cancelled
+
+
+def retry(job_id):
+    """Run a failed or cancelled job again with the same input, return True if it was queued"""
+    _clean_up()
+    db = _connection()
+    with db:
+        row = db.execute("SELECT attempts + 1, kind, payload FROM jobs WHERE id = ? AND status IN (?, ?)",
+                         (job_id, FAILED, CANCELLED)).fetchone()
+        if row is None:
+            return False
+        db.execute("UPDATE jobs SET status = ?, result = NULL, error = NULL, attempts = attempts + 1, started = NULL, finished = NULL, owner = ? WHERE id = ?",
+                   (QUEUED, OWNER, job_id))
+    _start(job_id, *row)
+    return True
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 2 and sys.argv[1] == "list":
+        for job_id, kind, state, attempts, error in _connection().execute(
+                "SELECT id, kind, status, attempts, error FROM jobs ORDER BY id DESC LIMIT 50"):
+            print(f"{job_id:6d} {kind:10s} {state:10s} attempts {attempts}  {error or ''}")
+    else:
+        print("usage: python job_queue.py list")
@@ -1,12 +1,9 @@
 #importing necessary libraries and custom modules
+import os
 import streamlit as st 
-#importing subpages and functions
-from settings_page import setup_flat_name, setup_roommates, settingspage
-from fridge_page import fridge_page
-from barcode_page import barcode_page
-from recipe_page import recipepage
-from store_externally import authentication, auto_save, delete_account
-from Overview_page import overview_page
+import model_registry #recipe model, loaded in the background after login
+import page_registry #subpages, imported when they are first opened
+from store_externally import authentication, auto_save
 
 #define the custom tokenizer function
 def custom_tokenizer(text):
@@ -87,6 +84,10 @@ st.sidebar.markdown(f'<img src="{logo_url}" class="circular-logo">', unsafe_allo
 #display of the main page
 if st.session_state["logged_in"]: #check if user is logged in
 
+    #start loading the recipe model in the background, so the Recipes tab doesn't wait for tensorflow
+    if os.environ.get("WASTELESS_ML_WARMUP", "1") != "0":
+        model_registry.warm_up()
+
     #sidebar navigation without account selection
     st.sidebar.title("Navigation") # title for navigation menu
     if st.sidebar.button("Overview"): # Navigate to overview page
@@ -103,31 +104,13 @@ if st.session_state["logged_in"]: #check if user is logged in
         st.session_state["logged_in"] = False #update login status
         st.session_state["username"] = None #clear username
         st.session_state["data"] = {} # clear user data
+        st.session_state.pop("persisted_shadow", None) #forget what was saved for this flat
+        st.session_state.pop("save_fingerprints", None)
 
 
-    #page display logic for selected page
-    if st.session_state["page"] == "overview": # ifthe overview page is selected:
-        overview_page() #display overview page
-        auto_save() # automatically save data
-    elif st.session_state["page"] == "inventory": # if inventory page is selected
-        fridge_page() #display inventory page
-        auto_save() #automatically save data
-    elif st.session_state["page"] == "scan": # if scan page is selected:
-        barcode_page() #display barcode scanning page
-        auto_save() #automaticaly save data
-    elif st.session_state["page"] == "recipes": # if recipes page is selected:
-        recipepage() #display recipe page
-        auto_save() #automatically save data
-    elif st.session_state["page"] == "settings": #if settings page is selected:
-        if not st.session_state["setup_finished"]: #if setup is incomplete:
-            if st.session_state["flate_name"] == "": #if flat's name is not set:
-                setup_flat_name() #prompt to set flat's name
-            else:
-                setup_roommates() #prompt to set up roommates
-        else:
-            settingspage() #display settings page
-            delete_account() #option to delete account
-        auto_save() #automatically save data
+    #page display logic for selected page: only the selected page's module is imported and run
+    page_registry.render(st.session_state["page"])
+    auto_save() #automatically save data
 else:
     #sidebar with account selection
     st.title("Wasteless") #display the app's name
@@ -0,0 +1,141 @@
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+#client for TheMealDB: parallel requests over one pooled http session, with timeouts and a cache shared by all users
+#point it to another server (e.g. the stub below) with the environment variable THEMEALDB_URL
+
+THEMEALDB_URL = os.environ.get("THEMEALDB_URL", "https://www.themealdb.com/api/json/v1/1") #base URL of the API
+MAX_WORKERS = int(os.environ.get("THEMEALDB_WORKERS", "8")) #requests running at the same time
+REQUEST_TIMEOUT = (3.05, 5) #seconds to connect, seconds to read
+CACHE_SECONDS = 6 * 3600 #recipes per ingredient change rarely
+CACHE_SIZE = 2000 #ingredients kept in the cache
+
+
+#small thread-safe cache where entries expire after some time
+class TTLCache:
+    def __init__(self, seconds=CACHE_SECONDS, size=CACHE_SIZE):
+        self.seconds = seconds
+        self.size = size
+        self._entries = {} #key -> (expiry time, value), dicts keep insertion order -> oldest first
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.monotonic() + self.seconds, value)
+            while len(self._entries) > self.size: #drop the oldest entries
+                self._entries.pop(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_cache = TTLCache()
+_session = None
+_executor = None
+_setup_lock = threading.Lock()
+
+
+#function to get the shared http session and thread pool (created on first use)
+def _shared():
+    global _session, _executor
+    with _setup_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=MAX_WORKERS) #reuse connections instead of a new TLS handshake per request
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="themealdb")
+        return _session, _executor
+
+
+#function to get the meals for one ingredient (cached)
+def fetch_meals(ingredient):
+    """Return the list of meals ({strMeal, idMeal, strMealThumb}) that use the ingredient"""
+    key = ingredient.strip().lower()
+    meals = _cache.get(key)
+    if meals is not None:
+        return meals
+    session, _ = _shared()
+    response = session.get(f"{THEMEALDB_URL}/filter.php", params={"i": ingredient}, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    meals = response.json().get("meals") or [] #the API returns "meals": null for unknown ingredients
+    _cache.put(key, meals)
+    return meals
+
+
+#function to fetch many ingredients in parallel and hand out the results as they arrive
+def iter_meals(ingredients, deadline=10.0):
+    """Yield (ingredient, meals or None on error) in order of arrival, stop waiting after deadline seconds"""
+    _, executor = _shared()
+    futures = {executor.submit(fetch_meals, ingredient): ingredient for ingredient in ingredients}
+    try:
+        for future in as_completed(futures, timeout=deadline):
+            try:
+                yield futures[future], future.result()
+            except (requests.RequestException, ValueError): #one slow or broken request doesn't stop the others
+                yield futures[future], None
+    except FuturesTimeout: #API too slow -> return what we have, late answers still fill the cache
+        return
+    finally:
+        for future in futures: #caller has enough results -> don't start the remaining requests
+            future.cancel()
+
+
+def cache_stats():
+    return {"hits": _cache.hits, "misses": _cache.misses}
+
+
+#local stub of the API for testing without network: python mealdb_client.py stub [port] [delay seconds]
+def run_stub_server(port=8765, delay=0.0, meals_per_ingredient=5):
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            ingredient = parse_qs(urlparse(self.path).query).get("i", [""])[0]
+            time.sleep(delay) #simulate a slow API
+            meals = [
+                {"strMeal": f"{ingredient.title()} Dish {i}", "idMeal": str(abs(hash((ingredient, i))) % 100000), "strMealThumb": ""}
+                for i in range(meals_per_ingredient)
+            ] if ingredient != "unknown" else None
+            body = json.dumps({"meals": meals}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args): #keep the console quiet
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    return server
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "stub":
+        port = int(sys.argv[2]) if len(sys.argv) > 2 else 8765
+        delay = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+        print(f"Stub running, start the app with THEMEALDB_URL=http://127.0.0.1:{port}")
+        run_stub_server(port, delay).serve_forever()
+    else:
+        print("usage: python mealdb_client.py stub [port] [delay seconds]")
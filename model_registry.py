@@ -0,0 +1,117 @@
+import os
+import threading
+import time
+
+#process-wide registry for the recipe model and its preprocessing components
+#every browser session shares the same loaded objects instead of keeping its own copy in st.session_state
+#the files are reloaded automatically when they change on disk
+#tensorflow and joblib are imported on first use, so starting the app doesn't pay for them
+#if the model was exported to numpy weights, tensorflow isn't needed at all
+
+MODEL_DIR = "models2"
+MODEL_FILES = {
+    "ml_model": "recipe_model.h5",
+    "vectorizer": "tfidf_ingredients.pkl",
+    "label_encoder_cuisine": "label_encoder_cuisine.pkl",
+    "label_encoder_recipe": "label_encoder_recipe.pkl",
+}
+NUMPY_WEIGHTS_FILE = "recipe_model_weights.npz" #created by python numpy_model.py export
+
+_lock = threading.Lock() #only one thread loads, the others wait and reuse the result
+_components = None
+_mtimes = None
+_stats = {"loads": 0, "load_seconds": 0.0, "last_load": None}
+_warm_up_thread = None
+
+
+def custom_tokenizer(text): #function for splitting text data
+    return text.split(', ') # -> split text based on commas and spaces
+
+
+def _use_numpy_model():
+    #exported numpy weights (see numpy_model.py) replace the keras model, unless WASTELESS_ML_RUNTIME=keras
+    return os.path.exists(os.path.join(MODEL_DIR, NUMPY_WEIGHTS_FILE)) and os.environ.get("WASTELESS_ML_RUNTIME") != "keras"
+
+
+def _file_mtimes():
+    files = dict(MODEL_FILES)
+    if _use_numpy_model():
+        files["ml_model"] = NUMPY_WEIGHTS_FILE
+    return {name: os.path.getmtime(os.path.join(MODEL_DIR, file)) for name, file in files.items()}
+
+
+#function to load the keras model (imports tensorflow)
+def _load_keras_model():
+    import tensorflow as tf
+    from tensorflow.keras.models import load_model
+
+    #include the custom tokenizer in custom_objects
+    custom_objects = {
+        'mse': tf.keras.losses.MeanSquaredError(), #mean squared error
+        'mae': tf.keras.metrics.MeanAbsoluteError(), #mean aboslute error
+        'accuracy': tf.keras.metrics.Accuracy(), #accuracy metric
+        'custom_tokenizer': custom_tokenizer #custmo tokenizer function
+    }
+    return load_model(os.path.join(MODEL_DIR, MODEL_FILES["ml_model"]), custom_objects=custom_objects)
+
+
+#function to load all components from disk
+def _load():
+    import joblib
+
+    if _use_numpy_model(): #no tensorflow needed
+        from numpy_model import NumpyRecipeModel
+        model = NumpyRecipeModel(os.path.join(MODEL_DIR, NUMPY_WEIGHTS_FILE))
+    else:
+        model = _load_keras_model()
+    vectorizer = joblib.load(os.path.join(MODEL_DIR, MODEL_FILES["vectorizer"]))
+    vectorizer.tokenizer = custom_tokenizer #makes sure the tokenizer is set correctly
+    return {
+        "ml_model": model,
+        "vectorizer": vectorizer,
+        "label_encoder_cuisine": joblib.load(os.path.join(MODEL_DIR, MODEL_FILES["label_encoder_cuisine"])),
+        "label_encoder_recipe": joblib.load(os.path.join(MODEL_DIR, MODEL_FILES["label_encoder_recipe"])),
+    }
+
+
+#function to get the shared components, loads them on first use or when the files changed
+def get_components():
+    """Return a dict with ml_model, vectorizer, label_encoder_cuisine and label_encoder_recipe"""
+    global _components, _mtimes
+    mtimes = _file_mtimes()
+    if _components is not None and mtimes == _mtimes: #fast path without the lock
+        return _components
+    with _lock:
+        if _components is None or mtimes != _mtimes: #check again, another thread may have loaded meanwhile
+            start = time.perf_counter()
+            _components = _load()
+            _mtimes = mtimes
+            _stats["loads"] += 1
+            _stats["load_seconds"] = time.perf_counter() - start
+            _stats["last_load"] = time.time()
+        return _components
+
+
+def is_loaded():
+    return _components is not None
+
+
+def stats():
+    """Number of loads and duration of the last one"""
+    return dict(_stats)
+
+
+#function to load the components in a background thread, e.g. right after login
+def warm_up():
+    """Start loading in the background (once per process), errors show up later in load_ml_components"""
+    global _warm_up_thread
+    with _lock:
+        if _components is not None or _warm_up_thread is not None: #already loaded or already tried
+            return
+        def load_quietly():
+            try:
+                get_components()
+            except Exception:
+                pass #the recipe page reports the error when the user needs the model
+        _warm_up_thread = threading.Thread(target=load_quietly, name="model-warm-up", daemon=True)
+        _warm_up_thread.start()
@@ -0,0 +1,92 @@
+import sys
+
+import numpy as np
+
+#inference for the recipe model with plain numpy, so the app doesn't need tensorflow in production
+#the model is Dense(128, relu) -> four heads: cuisine (softmax), recipe (softmax), time (linear), calories (linear)
+#export once with tensorflow installed: python numpy_model.py export
+#check that both give the same outputs: python numpy_model.py parity
+
+KERAS_FILE = "models2/recipe_model.h5"
+WEIGHTS_FILE = "models2/recipe_model_weights.npz"
+
+ACTIVATIONS = {
+    "linear": lambda x: x,
+    "relu": lambda x: np.maximum(x, 0),
+    "sigmoid": lambda x: 1 / (1 + np.exp(-x)),
+    "tanh": np.tanh,
+    "softmax": lambda x: _softmax(x),
+}
+
+
+def _softmax(x):
+    exp = np.exp(x - x.max(axis=-1, keepdims=True)) #shift for numerical stability
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+#function to convert the keras model to numpy arrays
+def export_weights(keras_file=KERAS_FILE, weights_file=WEIGHTS_FILE):
+    """Save kernels, biases and activations of all Dense layers to an .npz file (needs tensorflow)"""
+    from tensorflow.keras.models import load_model
+
+    model = load_model(keras_file, compile=False)
+    arrays = {}
+    hidden, heads = [], []
+    for layer in model.layers:
+        if layer.__class__.__name__ != "Dense": #input and dropout layers do nothing at inference time
+            continue
+        kernel, bias = layer.get_weights()
+        arrays[f"{layer.name}/kernel"] = kernel.astype(np.float32)
+        arrays[f"{layer.name}/bias"] = bias.astype(np.float32)
+        arrays[f"{layer.name}/activation"] = np.array(layer.get_config()["activation"])
+        (heads if layer.name in model.output_names else hidden).append(layer.name)
+    arrays["hidden_layers"] = np.array(hidden)
+    arrays["output_layers"] = np.array(model.output_names) #same order as model.predict returns them
+    np.savez(weights_file, **arrays)
+    return weights_file
+
+
+class NumpyRecipeModel:
+    """Drop-in replacement for the keras model's predict()"""
+
+    def __init__(self, weights_file=WEIGHTS_FILE):
+        with np.load(weights_file) as arrays:
+            def layer(name):
+                return (arrays[f"{name}/kernel"], arrays[f"{name}/bias"], ACTIVATIONS[str(arrays[f"{name}/activation"])])
+            self.hidden = [layer(name) for name in arrays["hidden_layers"]]
+            self.outputs = [layer(name) for name in arrays["output_layers"]]
+
+    def predict(self, x, verbose=0):
+        """Return a list with one array per output, like keras"""
+        hidden = np.asarray(x, dtype=np.float32)
+        for kernel, bias, activation in self.hidden:
+            hidden = activation(hidden @ kernel + bias)
+        return [activation(hidden @ kernel + bias) for kernel, bias, activation in self.outputs]
+
+
+#function to compare the numpy outputs with the keras outputs
+def check_parity(keras_file=KERAS_FILE, weights_file=WEIGHTS_FILE, samples=256, tolerance=1e-4):
+    """Return the largest absolute difference per output, raise if one is above the tolerance"""
+    from tensorflow.keras.models import load_model
+
+    keras_model = load_model(keras_file, compile=False)
+    numpy_model = NumpyRecipeModel(weights_file)
+    rng = np.random.default_rng(0)
+    x = rng.random((samples, keras_model.input_shape[1]), dtype=np.float32)
+    x *= rng.random((samples, keras_model.input_shape[1])) < 0.2 #sparse like tf-idf vectors
+    differences = [
+        float(np.abs(np.asarray(expected) - actual).max())
+        for expected, actual in zip(keras_model.predict(x, verbose=0), numpy_model.predict(x))
+    ]
+    if max(differences) > tolerance:
+        raise AssertionError(f"numpy model differs from keras model: {differences}")
+    return differences
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "export":
+        print(f"Saved {export_weights()}")
+    elif len(sys.argv) >= 2 and sys.argv[1] == "parity":
+        print(f"Largest difference per output: {check_parity()}")
+    else:
+        print("usage: python numpy_model.py export|parity")
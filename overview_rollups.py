@@ -0,0 +1,71 @@
+#maintained totals for the overview page, so it doesn't rebuild DataFrames from the whole history on every rerun
+#for purchases and consumption: total per roommate, per day and roommate, per roommate and product
+#the add/remove functions call record() right after appending an entry, which updates the totals in constant time
+#ensure() notices when the history lists were replaced (login, merge with another session's changes) and rebuilds once
+
+HISTORY_KEYS = ("purchases", "consumed")
+DEFAULT_DATE = "1900-01-01" #same default the overview used for entries without a date
+
+
+def _empty():
+    return {"by_mate": {}, "by_day": {}, "by_product": {}}
+
+
+def _add(table, mate, entry):
+    price = entry.get("Price", 0) or 0
+    table["by_mate"][mate] = table["by_mate"].get(mate, 0.0) + price
+    day = str(entry.get("Date") or DEFAULT_DATE)[:10] #"2024-12-01 18:30:00" -> "2024-12-01"
+    by_day = table["by_day"].setdefault(day, {})
+    by_day[mate] = by_day.get(mate, 0.0) + price
+    by_product = table["by_product"].setdefault(mate, {})
+    by_product[entry.get("Product")] = by_product.get(entry.get("Product"), 0.0) + price
+
+
+#functions to remember which list objects (and how long) something was computed from, also used by history_store
+#the lists themselves are kept and compared with "is": a new list can get a freed list's id after a login or a merge
+def sources(state, key):
+    return {mate: (entries, len(entries)) for mate, entries in state.get(key, {}).items()}
+
+
+def same_sources(stored, state, key):
+    current = state.get(key, {})
+    return stored.keys() == current.keys() and all(
+        entries is current[mate] and length == len(entries) for mate, (entries, length) in stored.items())
+
+
+def appended_one(stored, mate, entries):
+    """True if entries is the remembered list of this roommate (or a new one) with exactly one entry more"""
+    source, length = stored.get(mate, (entries, 0))
+    return source is entries and length == len(entries) - 1
+
+
+#function to compute all totals from the history (once per login)
+def rebuild(state):
+    rollups = {"sources": {}}
+    for key in HISTORY_KEYS:
+        rollups[key] = _empty()
+        for mate, entries in state.get(key, {}).items():
+            for entry in entries:
+                _add(rollups[key], mate, entry)
+        rollups["sources"][key] = sources(state, key)
+    state["rollups"] = rollups
+    return rollups
+
+
+#function to get up to date totals
+def ensure(state):
+    rollups = state.get("rollups")
+    if rollups is None or any(not same_sources(rollups["sources"][key], state, key) for key in HISTORY_KEYS):
+        return rebuild(state)
+    return rollups
+
+
+#function to add the entry that was just appended to state[key][mate]
+def record(state, key, mate, entry):
+    rollups = state.get("rollups")
+    entries = state[key][mate]
+    if rollups is None or not appended_one(rollups["sources"][key], mate, entries):
+        ensure(state) #totals are out of date anyway, the rebuild includes the new entry
+        return
+    _add(rollups[key], mate, entry)
+    rollups["sources"][key][mate] = (entries, len(entries))
@@ -0,0 +1,52 @@
+import importlib
+import sys
+import threading
+import time
+
+#the app's pages: name in st.session_state["page"] -> (module, function that draws the page)
+#a page module is imported the first time its page is opened (once per process) and only its function runs on reruns,
+#so a rerun of the overview doesn't import or run the recipe, scan and inventory pages
+
+PAGES = {
+    "overview": ("Overview_page", "overview_page"),
+    "inventory": ("fridge_page", "fridge_page"),
+    "scan": ("barcode_page", "barcode_page"),
+    "recipes": ("recipe_page", "recipepage"),
+    "settings": ("settings_page", "settings_main"),
+}
+
+_lock = threading.Lock()
+_stats = {} #page -> {"imports", "import_seconds", "renders", "render_seconds"}
+
+
+def _record(page, field, seconds):
+    with _lock:
+        page_stats = _stats.setdefault(page, {"imports": 0, "import_seconds": 0.0, "renders": 0, "render_seconds": 0.0})
+        page_stats[field + "s"] += 1
+        page_stats[field + "_seconds"] += seconds
+
+
+#function to get the function of a page, importing its module if needed
+def get_page(page):
+    module_name, function_name = PAGES[page]
+    module = sys.modules.get(module_name)
+    if module is None: #first visit of this page in this process
+        start = time.perf_counter()
+        module = importlib.import_module(module_name)
+        _record(page, "import", time.perf_counter() - start)
+    return getattr(module, function_name)
+
+
+#function to draw a page
+def render(page):
+    draw = get_page(page)
+    start = time.perf_counter()
+    try:
+        draw()
+    finally: #st.rerun() inside a page ends the run with an exception, the time still counts
+        _record(page, "render", time.perf_counter() - start)
+
+
+def stats():
+    with _lock:
+        return {page: dict(page_stats) for page, page_stats in _stats.items()}
@@ -0,0 +1,184 @@
+import csv
+import gzip
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+import requests
+
+#persistent barcode -> product cache in front of the OpenFoodFacts API
+#answers (and "unknown barcode" answers) are kept in a small sqlite file, so repeated scans need no http call
+#hits and misses are counted in memory and added to the same file in batches, so stats() covers every process that
+#uses the cache (the app and the job workers that run bulk scans)
+#common products can be imported from an OpenFoodFacts export, these never expire:
+#   python product_cache.py import en.openfoodfacts.org.products.csv.gz [country]
+#   python product_cache.py import openfoodfacts-products.jsonl.gz [country]
+
+CACHE_FILE = os.environ.get("WASTELESS_PRODUCT_DB", "product_cache.db")
+OPENFOODFACTS_URL = "https://world.openfoodfacts.org/api/v0/product/{}.json"
+REQUEST_TIMEOUT = (3.05, 5) #seconds to connect, seconds to read
+FOUND_SECONDS = 30 * 24 * 3600 #product data rarely changes
+NOT_FOUND_SECONDS = 24 * 3600 #unknown barcodes are asked again the next day
+IMPORTED = None #expiry of imported products: never
+FLUSH_EVERY = 50 #lookups counted in memory before they are added to the file
+
+_local = threading.local() #one sqlite connection per thread
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "negative_hits": 0, "misses": 0} #not yet in the file
+
+
+def _connection():
+    connection = getattr(_local, "connection", None)
+    if connection is None:
+        connection = sqlite3.connect(CACHE_FILE, timeout=30)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("""CREATE TABLE IF NOT EXISTS products (
+            barcode TEXT PRIMARY KEY, found INTEGER NOT NULL, name TEXT, brand TEXT, quantity TEXT, categories TEXT,
+            expires REAL)""") #expires NULL -> imported, never expires
+        connection.execute("CREATE TABLE IF NOT EXISTS lookups (outcome TEXT PRIMARY KEY, count INTEGER NOT NULL)")
+        _local.connection = connection
+    return connection
+
+
+def _count(key):
+    with _stats_lock:
+        _stats[key] += 1
+        pending = sum(_stats.values())
+    if pending >= FLUSH_EVERY:
+        flush_stats()
+
+
+#function to add the lookups counted in this process to the cache file (one transaction)
+def flush_stats():
+    with _stats_lock:
+        counts = {key: count for key, count in _stats.items() if count}
+        for key in _stats:
+            _stats[key] = 0
+    if not counts:
+        return
+    db = _connection()
+    with db:
+        db.executemany("""INSERT INTO lookups (outcome, count) VALUES (?, ?)
+                          ON CONFLICT (outcome) DO UPDATE SET count = count + excluded.count""", counts.items())
+
+
+#function to look a barcode up in the cache only
+def lookup(barcode):
+    """Return (True, product or None) if the cache knows the barcode, (False, None) otherwise"""
+    row = _connection().execute(
+        "SELECT found, name, brand, quantity, categories, expires FROM products WHERE barcode = ?", (barcode,)).fetchone()
+    if row is None or (row[5] is not None and row[5] < time.time()): #unknown or expired
+        return False, None
+    if not row[0]: #we already know OpenFoodFacts doesn't have it
+        return True, None
+    return True, {"name": row[1], "brand": row[2], "quantity": row[3], "categories": row[4]}
+
+
+def store(barcode, product, seconds):
+    """Remember a product (or None for an unknown barcode)"""
+    details = [product.get(key) for key in ("name", "brand", "quantity", "categories")] if product else [None] * 4
+    expires = None if seconds is None else time.time() + seconds
+    db = _connection()
+    with db:
+        db.execute(
+            "INSERT OR REPLACE INTO products (barcode, found, name, brand, quantity, categories, expires) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (barcode, product is not None, *details, expires),
+        )
+
+
+#function to ask OpenFoodFacts directly
+def fetch_product(barcode):
+    """Return the product dict, None if the barcode is unknown; raises requests exceptions on network errors"""
+    response = requests.get(OPENFOODFACTS_URL.format(barcode), timeout=REQUEST_TIMEOUT)
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    data = response.json()
+    if data.get("status") != 1: #status 0: barcode does not exist in the database
+        return None
+    product = data["product"]
+    return {
+        "name": product.get("product_name") or "Unknown Product", #when no value available default value
+        "brand": product.get("brands") or "Unknown Brand",
+        "quantity": product.get("quantity") or "",
+        "categories": product.get("categories") or "",
+    }
+
+
+#function to get product information: cache first, then the API
+def get_product(barcode):
+    known, product = lookup(barcode)
+    if known:
+        _count("hits" if product is not None else "negative_hits")
+        return product
+    _count("misses")
+    product = fetch_product(barcode)
+    store(barcode, product, FOUND_SECONDS if product is not None else NOT_FOUND_SECONDS)
+    return product
+
+
+def stats():
+    """Hits, negative hits, misses and hit rate of all processes using the cache file"""
+    flush_stats()
+    result = dict.fromkeys(_stats, 0)
+    result.update(_connection().execute("SELECT outcome, count FROM lookups").fetchall())
+    total = result["hits"] + result["negative_hits"] + result["misses"]
+    result["hit_rate"] = (result["hits"] + result["negative_hits"]) / total if total else 0.0
+    return result
+
+
+#functions to import an OpenFoodFacts export (csv is tab separated, jsonl has one product per line)
+def _open(path):
+    return gzip.open(path, "rt", encoding="utf-8") if path.endswith(".gz") else open(path, "r", encoding="utf-8")
+
+
+def _export_rows(path):
+    with _open(path) as file:
+        if ".jsonl" in path:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            csv.field_size_limit(sys.maxsize)
+            yield from csv.DictReader(file, delimiter="\t")
+
+
+def import_export(path, country=None, batch_size=5000):
+    """Import all products (or only those sold in country, e.g. "switzerland"), return the number imported"""
+    db = _connection()
+    batch = []
+    imported = 0
+    for row in _export_rows(path):
+        barcode = row.get("code")
+        name = row.get("product_name")
+        if not barcode or not name:
+            continue
+        if country:
+            countries = row.get("countries_tags") or ""
+            if isinstance(countries, list):
+                countries = ",".join(countries)
+            if country.lower() not in countries.lower():
+                continue
+        batch.append((str(barcode), True, name, row.get("brands") or "Unknown Brand", row.get("quantity") or "",
+                      row.get("categories") or "", IMPORTED))
+        if len(batch) >= batch_size:
+            with db:
+                db.executemany("INSERT OR REPLACE INTO products VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+            imported += len(batch)
+            batch = []
+    if batch:
+        with db:
+            db.executemany("INSERT OR REPLACE INTO products VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+        imported += len(batch)
+    return imported
+
+
+if __name__ == "__main__":
+    if len(sys.argv) in (3, 4) and sys.argv[1] == "import":
+        count = import_export(sys.argv[2], sys.argv[3] if len(sys.argv) == 4 else None)
+        print(f"Imported {count} products into {CACHE_FILE}")
+    else:
+        print("usage: python product_cache.py import EXPORT_FILE [country]")
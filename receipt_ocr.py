@@ -0,0 +1,183 @@
+import difflib
+import io
+import re
+import sys
+import threading
+
+import recipe_index
+import units
+
+#reads supermarket receipts (photo or PDF) and turns them into line items: product, quantity, unit, price
+#PDFs with a text layer are read directly, photos and scanned PDFs go through OCR (easyocr, pytesseract as fallback)
+#the OCR model is loaded once per process; the app runs read_receipt as a background job (job_queue), never in the script thread
+#try it without the app: python receipt_ocr.py RECEIPT.jpg|RECEIPT.pdf
+
+OCR_LANGUAGES = ["de", "fr", "en"] #swiss receipts
+
+_reader = None
+_reader_lock = threading.Lock()
+
+
+#function to get the shared OCR reader (easyocr loads its model for several seconds, so only once)
+def _get_reader():
+    global _reader
+    with _reader_lock:
+        if _reader is None:
+            try:
+                import easyocr
+                _reader = ("easyocr", easyocr.Reader(OCR_LANGUAGES, gpu=False, verbose=False))
+            except ImportError: #easyocr needs torch, tesseract is much smaller
+                import pytesseract
+                _reader = ("tesseract", pytesseract)
+        return _reader
+
+
+#function to read the text lines of an image
+def ocr_lines(image):
+    engine, reader = _get_reader()
+    if engine == "tesseract":
+        return [line for line in reader.image_to_string(image.convert("L"), lang="deu+fra+eng").splitlines() if line.strip()]
+    import numpy as np
+    boxes = reader.readtext(np.asarray(image.convert("RGB")))
+    #easyocr returns single words/blocks with their position, put the ones on the same height into one line
+    boxes.sort(key=lambda box: (box[0][0][1] + box[0][2][1]) / 2)
+    lines, current, current_y, height = [], [], None, 0
+    for corners, text, _ in boxes:
+        y = (corners[0][1] + corners[2][1]) / 2
+        height = max(corners[2][1] - corners[0][1], 1)
+        if current and abs(y - current_y) > height / 2:
+            lines.append(current)
+            current = []
+        if not current:
+            current_y = y
+        current.append((corners[0][0], text))
+    if current:
+        lines.append(current)
+    return [" ".join(text for _, text in sorted(line)) for line in lines]
+
+
+#function to get the text lines of a PDF or image file
+def receipt_lines(data, filename):
+    if filename.lower().endswith(".pdf"):
+        import fitz
+        from PIL import Image
+        lines = []
+        with fitz.open(stream=data, filetype="pdf") as document:
+            for page in document:
+                text = page.get_text()
+                if text.strip(): #digital receipt: the text is already there, no OCR needed
+                    lines.extend(line for line in text.splitlines() if line.strip())
+                else: #scanned receipt
+                    picture = page.get_pixmap(dpi=200)
+                    lines.extend(ocr_lines(Image.open(io.BytesIO(picture.tobytes("png")))))
+        return lines
+    from PIL import Image, ImageOps
+    with Image.open(io.BytesIO(data)) as image:
+        return ocr_lines(ImageOps.exif_transpose(image)) #phone photos are often stored rotated
+
+
+PRICE = r"(-?\d+[.,]\d{2})"
+LINE = re.compile(
+    r"^(?P<name>.*?[A-Za-zÀ-ÿ].*?)\s+"
+    r"(?:(?P<quantity>\d+(?:[.,]\d+)?)\s*(?:(?P<unit>kg|g|l|stk)\b|[x*]|(?=\s))\s*(?:[x*]\s*)?(?:" + PRICE + r"\s+)?)?"
+    r"(?P<price>" + PRICE[1:-1] + r")\s*[A-Z0-9]?$", #some shops print the VAT code after the price
+    re.IGNORECASE,
+)
+SKIP_WORDS = ("total", "summe", "mwst", "tva", "vat", "bar", "rückgeld", "retour", "karte", "card", "twint", "rabatt",
+              "subtotal", "zwischensumme", "gegeben", "cumulus", "supercard", "rundung", "chf")
+
+
+def _number(text):
+    return float(text.replace(",", "."))
+
+
+#function to turn receipt lines into items
+def parse_lines(lines):
+    """Return [{"Receipt line", "Product", "Quantity", "Unit", "Price"}] for every line that looks like an article"""
+    items = []
+    for line in lines:
+        line = " ".join(line.split())
+        match = LINE.match(line)
+        if not match:
+            continue
+        name = match.group("name").strip(" .:-")
+        if not name or any(word in name.lower().split() for word in SKIP_WORDS):
+            continue
+        price = _number(match.group("price"))
+        if price <= 0: #discounts and deposit returns
+            continue
+        quantity, unit = 1.0, "Pieces"
+        if match.group("quantity"):
+            quantity = _number(match.group("quantity"))
+            kind = (match.group("unit") or "").lower()
+            if kind in ("kg", "g"): #weighed articles
+                quantity, unit = units.convert(quantity, kind, "Grams"), "Grams" #exact, through integer milligrams
+            elif kind == "l":
+                unit = "Liters"
+            if quantity <= 0:
+                quantity = 1.0
+        items.append({"Receipt line": line, "Product": name, "Quantity": quantity, "Unit": unit, "Price": price})
+    return items
+
+
+#receipt words for the foods in our catalog (German and French receipts)
+SYNONYMS = {
+    "poulet": "chicken", "huhn": "chicken", "hähnchen": "chicken", "zwiebel": "onion", "zwiebeln": "onion", "oignon": "onion",
+    "knoblauch": "garlic", "ail": "garlic", "ingwer": "ginger", "gingembre": "ginger", "rind": "beef", "rindfleisch": "beef",
+    "boeuf": "beef", "kartoffel": "potato", "kartoffeln": "potato", "karotte": "carrot", "karotten": "carrot",
+    "rüebli": "carrot", "rueebli": "carrot", "carotte": "carrot", "brokkoli": "broccoli", "peperoni": "bell pepper",
+    "linsen": "lentil", "lentilles": "lentil", "sellerie": "celery", "fisch": "fish", "poisson": "fish", "kohl": "cabbage", "chou": "cabbage",
+    "limette": "lime", "eier": "egg", "oeufs": "egg", "rahm": "cream", "sahne": "cream", "crème": "cream", "speck": "bacon",
+    "käse": "cheese", "fromage": "cheese", "mehl": "flour", "farine": "flour", "zucker": "sugar", "sucre": "sugar",
+    "beurre": "butter", "apfel": "apple", "äpfel": "apple", "pommes": "apple", "zimt": "cinnamon", "cannelle": "cinnamon",
+    "brot": "bread", "pain": "bread", "petersilie": "parsley", "persil": "parsley", "milch": "milk", "lait": "milk",
+    "kokosmilch": "coconut milk", "tomaten": "tomato", "reis": "rice", "riz": "rice", "nudeln": "pasta", "teigwaren": "pasta", "pâtes": "pasta",
+}
+
+
+#function to find the known food a receipt article is, e.g. "M-Classic Rüebli 1kg" -> "carrots"
+def match_food(name, known_foods):
+    """known_foods: {normalized name: display name}; returns the display name or None"""
+    words = [recipe_index.normalize(SYNONYMS.get(word, word)) for word in re.findall(r"[^\W\d_]+", name.lower())]
+    for size in (3, 2, 1): #longest match first: "coconut milk" before "milk"
+        for start in range(len(words) - size + 1):
+            candidate = recipe_index.normalize(" ".join(words[start:start + size]))
+            if candidate in known_foods:
+                return known_foods[candidate]
+    for word in words: #typos of the OCR, e.g. "chiken"
+        close = difflib.get_close_matches(word, known_foods, n=1, cutoff=0.85)
+        if close:
+            return known_foods[close[0]]
+    return None
+
+
+#function to collect the food names the app knows: inventory first (keeps its spelling), then the recipe catalog
+def known_foods(inventory=()):
+    foods = {}
+    for item in inventory:
+        foods.setdefault(recipe_index.normalize(item), item)
+    for recipe in recipe_index.load_catalog():
+        for ingredient in recipe["ingredients"]:
+            foods.setdefault(recipe_index.normalize(ingredient), ingredient)
+    return foods
+
+
+#function to read a receipt completely (runs in a job worker process)
+def read_receipt(data, filename, inventory=()):
+    foods = known_foods(inventory)
+    items = parse_lines(receipt_lines(data, filename))
+    for item in items:
+        food = match_food(item["Product"], foods)
+        item["Add"] = food is not None #unknown articles (detergent, ...) are not added unless the user names them
+        if food:
+            item["Product"] = food
+    return items
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 2:
+        with open(sys.argv[1], "rb") as file:
+            for item in read_receipt(file.read(), sys.argv[1]):
+                print(f"{'+' if item['Add'] else ' '} {item['Product']:30s} {item['Quantity']:8.2f} {item['Unit']:7s} {item['Price']:7.2f}   | {item['Receipt line']}")
+    else:
+        print("usage: python receipt_ocr.py RECEIPT_FILE")
@@ -0,0 +1,212 @@
+import csv
+import json
+import os
+import string
+import sys
+import threading
+from urllib.parse import quote_plus
+
+#local recipe catalog with an inverted index ingredient -> recipes
+#ranks recipes by how much of the fridge they use, without any network call
+#the catalog is a json file; fill it from a TheMealDB dump or from a table like the one in the notebooks:
+#   python recipe_index.py import-mealdb meals.json
+#   python recipe_index.py import-table recipes.csv
+#   python recipe_index.py download-mealdb
+
+CATALOG_FILE = "recipe_catalog.json"
+
+
+#function to bring ingredient names into one form: "Onions " -> "onion"
+def normalize(ingredient):
+    name = " ".join(ingredient.lower().split())
+    if name.endswith("oes") and len(name) > 4: #potatoes, tomatoes
+        return name[:-2]
+    if name.endswith("s") and not name.endswith(("ss", "us")) and len(name) > 3: #onions, carrots (not "swiss", "hummus")
+        return name[:-1]
+    return name
+
+
+class RecipeIndex:
+    def __init__(self, recipes):
+        self.recipes = recipes #list of {"id", "title", "ingredients", "link", ...}
+        self.ingredient_sets = [] #normalized ingredients per recipe
+        self.ingredient_names = [] #normalized -> name as written in the recipe, per recipe (shown to the user)
+        self.postings = {} #normalized ingredient -> list of recipe positions
+        self.titles = {recipe["title"].lower(): position for position, recipe in enumerate(recipes)}
+        for position, recipe in enumerate(recipes):
+            names = {normalize(ingredient): " ".join(ingredient.split()) for ingredient in recipe["ingredients"]}
+            ingredients = set(names)
+            self.ingredient_sets.append(ingredients)
+            self.ingredient_names.append(names)
+            for ingredient in ingredients:
+                self.postings.setdefault(ingredient, []).append(position)
+
+    def query(self, inventory, expiring=(), limit=3):
+        """Rank recipes by share of their ingredients in the inventory, then fewest missing, then most expiring items used"""
+        available = {normalize(item): item for item in inventory} #normalized -> name as stored in the inventory
+        expiring = {normalize(item) for item in expiring}
+        matched = {} #recipe position -> matched normalized ingredients
+        for ingredient in available: #only recipes that share at least one ingredient are touched
+            for position in self.postings.get(ingredient, ()):
+                matched.setdefault(position, []).append(ingredient)
+
+        results = []
+        for position, hits in matched.items():
+            ingredients = self.ingredient_sets[position]
+            names = self.ingredient_names[position]
+            recipe = self.recipes[position]
+            results.append({
+                "id": recipe["id"],
+                "title": recipe["title"],
+                "link": recipe.get("link") or f"https://www.google.com/search?q={quote_plus(recipe['title'] + ' recipe')}",
+                "coverage": len(hits) / len(ingredients),
+                "used_ingredients": sorted(available[ingredient] for ingredient in hits),
+                "missed_ingredients": sorted(names[ingredient] for ingredient in ingredients if ingredient not in available),
+                "expiring_used": sum(1 for ingredient in hits if ingredient in expiring),
+                "cuisine": recipe.get("cuisine"),
+            })
+        results.sort(key=lambda result: (-result["coverage"], len(result["missed_ingredients"]), -result["expiring_used"], result["title"]))
+        return results[:limit]
+
+    def _value_result(self, position, value, worth, available):
+        ingredients = self.ingredient_sets[position]
+        names = self.ingredient_names[position]
+        recipe = self.recipes[position]
+        return {
+            "id": recipe["id"],
+            "title": recipe["title"],
+            "link": recipe.get("link") or f"https://www.google.com/search?q={quote_plus(recipe['title'] + ' recipe')}",
+            "saved": value,
+            "coverage": len(ingredients & available) / len(ingredients),
+            "used_ingredients": sorted(worth[ingredient][0] for ingredient in ingredients if ingredient in worth),
+            "missed_ingredients": sorted(names[ingredient] for ingredient in ingredients if ingredient not in available),
+            "cuisine": recipe.get("cuisine"),
+        }
+
+    def rank_by_value(self, values, inventory=(), limit=5):
+        """Rank recipes by the value of the given ingredients ({name: CHF}) they use, then by share in the inventory"""
+        worth = _worth(values)
+        available = {normalize(item) for item in inventory} | set(worth)
+        saved = {} #recipe position -> value of the ingredients it uses, one pass over the postings
+        for ingredient, (_, value) in worth.items():
+            for position in self.postings.get(ingredient, ()):
+                saved[position] = saved.get(position, 0.0) + value
+
+        results = [self._value_result(position, value, worth, available) for position, value in saved.items()]
+        results.sort(key=lambda result: (-result["saved"], -result["coverage"], len(result["missed_ingredients"]), result["title"]))
+        return results[:limit]
+
+    def value_of(self, title, values, inventory=()):
+        """The rank_by_value result of one recipe by its title, None if the catalog doesn't have it"""
+        position = self.titles.get(title.lower())
+        if position is None:
+            return None
+        worth = _worth(values)
+        available = {normalize(item) for item in inventory} | set(worth)
+        value = sum(worth[ingredient][1] for ingredient in self.ingredient_sets[position] if ingredient in worth)
+        return self._value_result(position, value, worth, available)
+
+
+#function to add up values per normalized ingredient: {name: CHF} -> {normalized: (name as stored, CHF)}
+def _worth(values):
+    worth = {}
+    for item, value in values.items():
+        name, total = worth.get(normalize(item), (item, 0.0))
+        worth[normalize(item)] = (name, total + value)
+    return worth
+
+
+_index = None
+_index_mtime = None
+_index_lock = threading.Lock()
+
+
+#function to get the shared index, rebuilt when the catalog file changes
+def get_index():
+    global _index, _index_mtime
+    mtime = os.path.getmtime(CATALOG_FILE) if os.path.exists(CATALOG_FILE) else None
+    with _index_lock:
+        if _index is None or mtime != _index_mtime:
+            _index = RecipeIndex(load_catalog())
+            _index_mtime = mtime
+        return _index
+
+
+def load_catalog():
+    if not os.path.exists(CATALOG_FILE):
+        return []
+    with open(CATALOG_FILE, "r") as file:
+        return json.load(file)["recipes"]
+
+
+#function to add recipes to the catalog (recipes with the same id are replaced)
+def save_recipes(recipes):
+    catalog = {recipe["id"]: recipe for recipe in load_catalog()}
+    for recipe in recipes:
+        catalog[recipe["id"]] = recipe
+    with open(CATALOG_FILE, "w") as file:
+        json.dump({"recipes": list(catalog.values())}, file, indent=1)
+    return len(recipes)
+
+
+#function to convert meals in TheMealDB's lookup/search format
+def recipes_from_mealdb(meals):
+    recipes = []
+    for meal in meals:
+        ingredients = [
+            meal[f"strIngredient{i}"].strip()
+            for i in range(1, 21)
+            if meal.get(f"strIngredient{i}") and meal[f"strIngredient{i}"].strip()
+        ]
+        if ingredients:
+            recipes.append({
+                "id": f"mealdb-{meal['idMeal']}",
+                "title": meal["strMeal"],
+                "ingredients": ingredients,
+                "cuisine": meal.get("strArea"),
+                "link": f"https://www.themealdb.com/meal/{meal['idMeal']}",
+            })
+    return recipes
+
+
+#function to import a json dump of TheMealDB ({"meals": [...]})
+def import_mealdb_dump(path):
+    with open(path, "r") as file:
+        return save_recipes(recipes_from_mealdb(json.load(file)["meals"] or []))
+
+
+#function to download the whole TheMealDB catalog (one request per first letter)
+def download_mealdb():
+    import mealdb_client
+    session, _ = mealdb_client._shared()
+    meals = []
+    for letter in string.ascii_lowercase:
+        response = session.get(f"{mealdb_client.THEMEALDB_URL}/search.php", params={"f": letter}, timeout=mealdb_client.REQUEST_TIMEOUT)
+        response.raise_for_status()
+        meals.extend(response.json().get("meals") or [])
+    return save_recipes(recipes_from_mealdb(meals))
+
+
+#function to import a table like the notebook dataset (columns Recipe, Ingredients, Cuisine, ...)
+def import_table(path):
+    recipes = []
+    with open(path, "r", newline="") as file:
+        for row in csv.DictReader(file):
+            recipes.append({
+                "id": f"local-{normalize(row['Recipe']).replace(' ', '-')}",
+                "title": row["Recipe"],
+                "ingredients": [ingredient.strip() for ingredient in row["Ingredients"].split(",") if ingredient.strip()],
+                "cuisine": row.get("Cuisine"),
+                "link": row.get("Link") or None,
+            })
+    return save_recipes(recipes)
+
+
+if __name__ == "__main__":
+    commands = {"import-mealdb": import_mealdb_dump, "import-table": import_table}
+    if len(sys.argv) == 3 and sys.argv[1] in commands:
+        print(f"Imported {commands[sys.argv[1]](sys.argv[2])} recipes into {CATALOG_FILE}")
+    elif len(sys.argv) == 2 and sys.argv[1] == "download-mealdb":
+        print(f"Imported {download_mealdb()} recipes into {CATALOG_FILE}")
+    else:
+        print("usage: python recipe_index.py import-mealdb FILE | import-table FILE | download-mealdb")
@@ -1,91 +1,74 @@
 import streamlit as st #creates app interface
-import requests #to send http requests for API
+import mealdb_client #parallel, cached requests to TheMealDB
+import recipe_index #local recipe catalog with ingredient index
+import inventory #the flat's products
+import recommendations #recipes that use up what expires first
 import random #enables radom selection
 import pandas as pd #library to handle data
+import numpy as np #for the batched predictions
 from datetime import datetime 
 
-# add new imports for ML model
-from tensorflow.keras.models import load_model
-import joblib
-import os
-import tensorflow as tf
+# ML model: tensorflow is only imported by model_registry when the model is needed first
+import model_registry #shared model, loaded once per process
 
-#replace Spoonacular API configuration with TheMealDB
-THEMEALDB_URL = 'https://www.themealdb.com/api/json/v1/1/filter.php'#URL to get recipe data
-
-#initialization of session state variables and examples if nothing in session_state
-if "inventory" not in st.session_state:
-    st.session_state["inventory"] = {
-        "Tomato": {"Quantity": 5, "Unit": "gram", "Price": 3.0}, #variables for inventory
-        "Banana": {"Quantity": 3, "Unit": "gram", "Price": 5.0},
-        "Onion": {"Quantity": 2, "Unit": "piece", "Price": 1.5},
-        "Garlic": {"Quantity": 3, "Unit": "clove", "Price": 0.5},
-        "Olive Oil": {"Quantity": 1, "Unit": "liter", "Price": 8.0},
-    }
-
-# initialize more session state variables for roommate and recipe-related data
-if "roommates" not in st.session_state: #define examples if nothing added
-    st.session_state["roommates"] = ["Bilbo", "Frodo", "Gandalf der Weise"] # Example rommates
-if "selected_user" not in st.session_state:
-    st.session_state["selected_user"] = None #keeps track of which user is selected
-if "recipe_suggestions" not in st.session_state:
-    st.session_state["recipe_suggestions"] = [] #stores suggested recipe titles
-if "recipe_links" not in st.session_state:
-    st.session_state["recipe_links"] = {} #stores resipe links and extra data
-if "selected_recipe" not in st.session_state:
-    st.session_state["selected_recipe"] = None #the recipe the user decides to cook
-if "selected_recipe_link" not in st.session_state:
-    st.session_state["selected_recipe_link"] = None #link to the selected recipe
-if "cooking_history" not in st.session_state:
-    st.session_state["cooking_history"] = [] #history of recipes cooked and their ratings
-
-#initialize additional session state variables for ML predictions
-if "ml_model" not in st.session_state:
-    st.session_state["ml_model"] = None #store ML model
-if "vectorizer" not in st.session_state:
-    st.session_state["vectorizer"] = None #store vectorizer for text data
-if "label_encoder_cuisine" not in st.session_state:
-    st.session_state["label_encoder_cuisine"] = None #encoder for cuisine categories
-if "label_encoder_recipe" not in st.session_state:
-    st.session_state["label_encoder_recipe"] = None #encoder for recipe categories
+RECIPE_COUNT = 3 #recipes suggested from the inventory
+MIN_COVERAGE = 0.5 #catalog recipes with less of their ingredients in the fridge are topped up with TheMealDB results
 
 #function to suggest recipes based on inventory
 def get_recipes_from_inventory(selected_ingredients=None):
-    """Get recipes from TheMealDB API based on ingredients"""
-    ingredients = selected_ingredients if selected_ingredients else list(st.session_state["inventory"].keys()) #use provided ingedients or inventory
+    """Get recipes from the local catalog (best inventory coverage) or from TheMealDB API based on ingredients"""
+    ingredients = selected_ingredients if selected_ingredients else inventory.products(st.session_state) #use provided ingedients or inventory
     if not ingredients: #check if inventory empty
         st.warning("Inventory is empty. Move your lazy ass to Migros!")
         return [], {}
     
-    recipe_titles = [] #list to store recipe names
-    recipe_links = {} #dictinary tostore recipe links
-    displayed_recipes = 0 #counter-> limit number of disyplayed recipes
+    expiring = list(recommendations.value_at_risk(st.session_state)) #products with lots that go off in the next days
+    ingredients = sorted(ingredients, key=lambda item: item not in expiring) #expiring food is asked for first
+    
+    #first try the local recipe catalog: ranked by how much of the fridge a recipe uses, no network needed
+    local_matches = recipe_index.get_index().query(ingredients, expiring=expiring, limit=RECIPE_COUNT)
+    good_matches = [match for match in local_matches if match["coverage"] >= MIN_COVERAGE]
+    recipe_titles = [match["title"] for match in good_matches] #list to store recipe names
+    recipe_links = { #dictinary tostore recipe links
+        match["title"]: {"link": match["link"], "missed_ingredients": match["missed_ingredients"]}
+        for match in good_matches
+    }
+    if len(recipe_titles) >= RECIPE_COUNT:
+        return recipe_titles, recipe_links
+    
+    #the catalog has no good recipe for these ingredients (small catalog) -> fill up with recipes from TheMealDB
+    displayed_recipes = len(recipe_titles) #counter-> limit number of disyplayed recipes
+    answered = 0 #counter -> ingredients the API answered for
     
-    for ingredient in ingredients: #loop thorugh each ingredient
-        response = requests.get(f"{THEMEALDB_URL}?i={ingredient}") #get recipes using the ingredient
+    for ingredient, meals in mealdb_client.iter_meals(ingredients): #requests run in parallel, results arrive as they finish
+        if meals is None: #request failed or timed out -> continue with the other ingredients
+            continue
+        answered += 1
+        meals = list(meals) #copy, the cached list is shared with other users
+        random.shuffle(meals) #shuffle meals -> adds randomness
         
-        if response.status_code == 200: #if request succesful
-            data = response.json() #convert JSON data into python dic.
-            meals = data.get("meals", []) #get list of meals
-            
-            random.shuffle(meals) #shuffle meals -> adds randomness
-            
-            for meal in meals: #loop through each meal
-                if meal["strMeal"] not in recipe_titles: #avoid duplicates
-                    recipe_titles.append(meal["strMeal"]) #add recipe title
-                    recipe_links[meal["strMeal"]] = { #store recipe link
-                        "link": f"https://www.themealdb.com/meal/{meal['idMeal']}",
-                        "missed_ingredients": []  # TheMealDB does not provide missed ingredients
-                    }
-                    displayed_recipes += 1 #increment counter
-                    
-                    if displayed_recipes >= 3: #limit to 3 recipes
-                        break
-            if displayed_recipes >= 3: #break outer loop if limit reahed
-                break
-        else:
-            st.error("Error fetching recipes. Please try again later.") #show error
-            return [], {}
+        for meal in meals: #loop through each meal
+            if meal["strMeal"] not in recipe_titles: #avoid duplicates
+                recipe_titles.append(meal["strMeal"]) #add recipe title
+                recipe_links[meal["strMeal"]] = { #store recipe link
+                    "link": f"https://www.themealdb.com/meal/{meal['idMeal']}",
+                    "missed_ingredients": []  # TheMealDB does not provide missed ingredients
+                }
+                displayed_recipes += 1 #increment counter
+                
+                if displayed_recipes >= RECIPE_COUNT: #limit to 3 recipes
+                    break
+        if displayed_recipes >= RECIPE_COUNT: #stop waiting for the other requests if limit reahed
+            break
+    
+    if answered == 0 and local_matches: #API not reachable -> the catalog recipes are still better than nothing
+        for match in local_matches:
+            if match["title"] not in recipe_links:
+                recipe_titles.append(match["title"])
+                recipe_links[match["title"]] = {"link": match["link"], "missed_ingredients": match["missed_ingredients"]}
+    elif answered == 0: #no ingredient could be fetched
+        st.error("Error fetching recipes. Please try again later.") #show error
+        return [], {}
     
     return recipe_titles, recipe_links #return list of recipes and their links
 
@@ -110,76 +93,92 @@ def rate_recipe(recipe_title, recipe_link):
             st.warning("Please select a user first.") # warning message
 
 
-def custom_tokenizer(text): #function for splitting text data
-    return text.split(', ') # -> split text based on commas and spaces
-
 def load_ml_components(): 
     """Load the trained model and preprocessing components"""
     try:
-        if st.session_state["ml_model"] is None: #load ML model if no already laoded
-            #include the custom tokenizer in custom_objects
-            custom_objects = {
-                'mse': tf.keras.losses.MeanSquaredError(), #mean squared error
-                'mae': tf.keras.metrics.MeanAbsoluteError(), #mean aboslute error
-                'accuracy': tf.keras.metrics.Accuracy(), #accuracy metric
-                'custom_tokenizer': custom_tokenizer #custmo tokenizer function
-            }
-            st.session_state["ml_model"] = load_model('models2/recipe_model.h5', custom_objects=custom_objects)
-        
-        if st.session_state["vectorizer"] is None: #load vectorizer if not already loaded
-            vectorizer = joblib.load('models2/tfidf_ingredients.pkl') 
-            #makes sure the tokenizer is set correctly
-            vectorizer.tokenizer = custom_tokenizer
-            st.session_state["vectorizer"] = vectorizer
-        
-        if st.session_state["label_encoder_cuisine"] is None: #load cuisine label encoder
-            st.session_state["label_encoder_cuisine"] = joblib.load('models2/label_encoder_cuisine.pkl')
-        
-        if st.session_state["label_encoder_recipe"] is None: #load recipe label encoder
-            st.session_state["label_encoder_recipe"] = joblib.load('models2/label_encoder_recipe.pkl')
-        
+        model_registry.get_components() #loaded once per process and shared by all sessions
         return True #return success
     except Exception as e:
         st.error(f"Error loading ML components: {str(e)}") #show error meesage
         return False
+#function to predict recipes for many ingredient lists in one pass
+def predict_recipes(ingredient_lists, top_k=3):
+    """Return one dict per ingredient list with the top_k recipes and cuisines (with scores), time and calories"""
+    if not ingredient_lists:
+        return []
+    components = model_registry.get_components() #shared model and preprocessing components
+
+    texts = [', '.join(ingredients) for ingredients in ingredient_lists] #one string per ingredient list
+    ingredients_vec = components["vectorizer"].transform(texts).toarray() #vectorize all of them at once
+    cuisine_scores, recipe_scores, prep_times, calories = components["ml_model"].predict(ingredients_vec, verbose=0) #one model call for the whole batch
+
+    #indices of the top_k scores per row, best first
+    top_cuisines = np.argsort(-cuisine_scores, axis=1)[:, :top_k]
+    top_recipes = np.argsort(-recipe_scores, axis=1)[:, :top_k]
+    cuisine_names = components["label_encoder_cuisine"].classes_ #decode with the encoder's class list
+    recipe_names = components["label_encoder_recipe"].classes_
+
+    return [
+        {
+            'recipes': [(str(recipe_names[i]), float(recipe_scores[row, i])) for i in top_recipes[row]],
+            'cuisines': [(str(cuisine_names[i]), float(cuisine_scores[row, i])) for i in top_cuisines[row]],
+            'preparation_time': float(prep_times[row][0]),
+            'calories': float(calories[row][0]),
+        }
+        for row in range(len(texts))
+    ]
+
 def predict_recipe(ingredients): #function to predict recipes based on selected ingredients
     """Predict recipe and additional details based on selected ingredients"""
     try:
-
-        ingredients_text = ', '.join(ingredients) #convert list of ingredients to single string
-        ingredients_vec = st.session_state["vectorizer"].transform([ingredients_text]).toarray() #vectorize ingredients
-        
-       
-        predictions = st.session_state["ml_model"].predict(ingredients_vec) #make predictions
-        
-        
-        cuisine_index = predictions[0].argmax() #get index of predicted cuisine
-        recipe_index = predictions[1].argmax() #get index of predicted recipe
-        
-        #get recipe and cuisine names
-        predicted_cuisine = st.session_state["label_encoder_cuisine"].inverse_transform([cuisine_index])[0]#decode cuisine
-        predicted_recipe = st.session_state["label_encoder_recipe"].inverse_transform([recipe_index])[0] #decode recipe
-        
-        #get preparation time and calories
-        predicted_prep_time = predictions[2][0][0]
-        predicted_calories = predictions[3][0][0]
-        
+        prediction = predict_recipes([ingredients], top_k=1)[0] #batch of one
         return {
-            'recipe': predicted_recipe,
-            'cuisine': predicted_cuisine,
-            'preparation_time': predicted_prep_time,
-            'calories': predicted_calories
+            'recipe': prediction['recipes'][0][0],
+            'cuisine': prediction['cuisines'][0][0],
+            'preparation_time': prediction['preparation_time'],
+            'calories': prediction['calories']
         }
     except Exception as e:
         st.error(f"Error making prediction: {str(e)}") #show error message
         return None
+
+#function to collect ingredient sets to score together: whole fridge and each roommate's own stock
+def inventory_subsets():
+    subsets = {"Whole fridge": inventory.products(st.session_state)}
+    for mate in st.session_state["roommates"]:
+        bought = {inventory.lookup(st.session_state, purchase["Product"]) for purchase in st.session_state.get("purchases", {}).get(mate, [])} #stored spelling
+        stock = [item for item in inventory.products(st.session_state) if item in bought] #products this roommate bought and that are still there
+        if stock:
+            subsets[f"{mate}'s stock"] = stock
+    return subsets
+
+#function to show the best recipes for several ingredient sets at once
+def show_batch_recommendations():
+    subsets = inventory_subsets()
+    if not subsets["Whole fridge"]:
+        return
+    if st.button("Score whole fridge and each roommate's stock"):
+        if load_ml_components():
+            try:
+                predictions = predict_recipes(list(subsets.values()), top_k=3) #all subsets in one model call
+            except Exception as e:
+                st.error(f"Error making prediction: {str(e)}") #show error message
+                return
+            rows = [
+                {"Ingredients from": name, "Rank": rank + 1, "Recipe": recipe, "Score": f"{score:.0%}",
+                 "Cuisine": prediction['cuisines'][0][0]}
+                for name, prediction in zip(subsets, predictions)
+                for rank, (recipe, score) in enumerate(prediction['recipes'])
+            ]
+            st.table(pd.DataFrame(rows)) #one table for all subsets
+
 #show preferenced recipe recommendations
 def show_preference_based_recommendations():
     """Show a section for preference-based recipe recommendations"""
     st.subheader("🎯 Get Personalized Recipe Recommendations")
     
     # get all unique ingredients from inventory
-    all_ingredients = set(st.session_state["inventory"].keys())
+    all_ingredients = set(inventory.products(st.session_state))
     
     # let user select preferred ingredients
     selected_ingredients = st.multiselect(
@@ -225,10 +224,35 @@ def show_preference_based_recommendations():
                 st.success(f"Here's a recipe you might like: {recipe_titles[0]}")
                 st.markdown(f"[View Recipe Details]({recipe_links[recipe_titles[0]]['link']})")
 
+#function to show the recipes that save the most food that is about to go off
+def show_expiry_recommendations():
+    predict = predict_recipes if model_registry.is_loaded() else None #the model is only used once it is loaded, the page never waits for it
+    try:
+        suggestions = recommendations.recommend(st.session_state, predict=predict)
+    except Exception: #model failed -> catalog recipes only
+        suggestions = recommendations.recommend(st.session_state)
+    if not suggestions:
+        return
+    best = suggestions[0]
+    if best["verified"]:
+        st.success(f"Cook **{best['title']}** tonight to save CHF {best['saved']:.2f} of food that expires soon "
+                   f"({', '.join(best['used_ingredients'])}). [View Recipe]({best['link']})")
+    else: #only the model knows this recipe, what it would save can't be checked
+        st.info(f"Some food expires soon, the recipe model suggests **{best['title']}**. [View Recipe]({best['link']})")
+    if len(suggestions) > 1:
+        with st.expander("More recipes for food that expires soon"):
+            st.table(pd.DataFrame([
+                {"Recipe": suggestion["title"], "Saves (CHF)": f"{suggestion['saved']:.2f}" if suggestion["verified"] else "unknown",
+                 "Uses": ", ".join(suggestion["used_ingredients"]), "Extra ingredients": ", ".join(suggestion["missed_ingredients"])}
+                for suggestion in suggestions[1:]
+            ]))
+
 # main function to run the recipe page
 def recipepage():
+    st.session_state.setdefault("selected_user", None) #keeps track of which user is selected
     st.title("You think you can cook! Better take a recipe!") # Funny titles on page :)
     st.subheader("Delulu is not the solulu")
+    show_expiry_recommendations() #what to cook tonight so nothing has to be thrown away
     
     # add tabs for different recipe finding methods
     tab1, tab2 = st.tabs(["🔍 Standard Search", "🎯 Preference Based"])
@@ -246,7 +270,7 @@ def recipepage():
             #recipe selection form - custom or inventory
             with st.form("recipe_form"): #form to get recipe
                 if search_mode == "Custom (choose ingredients)": #if user chooses to select specific ingredients
-                    selected_ingredients = st.multiselect("Select ingredients from inventory:", st.session_state["inventory"].keys())
+                    selected_ingredients = st.multiselect("Select ingredients from inventory:", inventory.products(st.session_state))
                 else:
                     selected_ingredients = None  # use entire inventory if "automatic" selected
                 
@@ -304,8 +328,31 @@ def recipepage():
             selected_roommate = st.selectbox("Select your name:", st.session_state["roommates"], key="pref_roommate")
             st.session_state["selected_user"] = selected_roommate
             show_preference_based_recommendations() #shwo personalized recomendations
+            show_batch_recommendations() #best recipes for the whole fridge and per roommate
         else:
             st.warning("No roommates available.") #warn if no roommates exist
 
-#run recipe page
-recipepage()
+#run this page on its own for testing with example data: streamlit run recipe_page.py
+if __name__ == "__main__":
+    if "inventory" not in st.session_state:
+        st.session_state["inventory"] = {
+            "Tomato": {"Quantity": 5, "Unit": "gram", "Price": 3.0}, #variables for inventory
+            "Banana": {"Quantity": 3, "Unit": "gram", "Price": 5.0},
+            "Onion": {"Quantity": 2, "Unit": "piece", "Price": 1.5},
+            "Garlic": {"Quantity": 3, "Unit": "clove", "Price": 0.5},
+            "Olive Oil": {"Quantity": 1, "Unit": "liter", "Price": 8.0},
+        }
+    # initialize more session state variables for roommate and recipe-related data
+    if "roommates" not in st.session_state: #define examples if nothing added
+        st.session_state["roommates"] = ["Bilbo", "Frodo", "Gandalf der Weise"] # Example rommates
+    if "recipe_suggestions" not in st.session_state:
+        st.session_state["recipe_suggestions"] = [] #stores suggested recipe titles
+    if "recipe_links" not in st.session_state:
+        st.session_state["recipe_links"] = {} #stores resipe links and extra data
+    if "selected_recipe" not in st.session_state:
+        st.session_state["selected_recipe"] = None #the recipe the user decides to cook
+    if "selected_recipe_link" not in st.session_state:
+        st.session_state["selected_recipe_link"] = None #link to the selected recipe
+    if "cooking_history" not in st.session_state:
+        st.session_state["cooking_history"] = [] #history of recipes cooked and their ratings
+    recipepage()
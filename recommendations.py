@@ -0,0 +1,71 @@
+from urllib.parse import quote_plus
+
+import inventory #lots and their expiry dates
+import recipe_index #local recipe catalog
+
+#recipes that use up the food which goes off first ("cook this tonight to save CHF X")
+#value at risk: what the lots that expire within the next days cost, per product
+#catalog recipes are ranked by the value at risk of the ingredients they use (one pass over the ingredient index);
+#the recipe model scores a few ingredient lists built from the expiring food in one batched call; a suggestion the
+#catalog knows counts with the value its real ingredients use, one it doesn't know is listed as unverified without a saving
+
+EXPIRY_DAYS = 3
+MODEL_LISTS = 5 #ingredient lists per model call: all expiring food + the most valuable products with the rest of the fridge
+
+
+#function to sum up the value of the lots that expire soon: {product as stored: CHF}
+def value_at_risk(state, days=EXPIRY_DAYS, today=None):
+    values = {}
+    for lot in inventory.expiring_soon(state, days, today):
+        values[lot.product] = values.get(lot.product, 0.0) + lot.price
+    return values
+
+
+def _model_lists(values, fridge):
+    expiring = sorted(values, key=values.get, reverse=True) #most valuable first
+    rest = [item for item in fridge if item not in values]
+    lists = [expiring]
+    for item in expiring[:MODEL_LISTS - 1]:
+        if len(expiring) > 1 or rest: #a list equal to the first one would only repeat it
+            lists.append([item] + rest)
+    return lists
+
+
+#function to rank recipes by the expiring value they use; predict is a batch function like recipe_page.predict_recipes
+def recommend(state, days=EXPIRY_DAYS, limit=5, today=None, predict=None):
+    """Return [{"title", "link", "saved", "used_ingredients", "missed_ingredients", "source", "verified"}], biggest saving first
+
+    Equal savings keep the catalog's order (more of the recipe in the fridge first); unverified model suggestions
+    (saved 0.0) come last
+    """
+    values = value_at_risk(state, days, today)
+    if not values:
+        return []
+    fridge = inventory.products(state)
+    index = recipe_index.get_index()
+    results = {}
+    for match in index.rank_by_value(values, fridge, limit=limit):
+        results[match["title"].lower()] = dict(match, source="catalog", verified=True, rank=len(results))
+
+    if predict is not None:
+        lists = _model_lists(values, fridge)
+        for prediction in predict(lists): #one model call for all lists
+            for title, score in prediction["recipes"]:
+                if title.lower() in results:
+                    continue
+                match = index.value_of(title, values, fridge) #what the recipe really uses of the expiring food
+                if match is not None:
+                    if match["saved"] > 0:
+                        results[title.lower()] = dict(match, source="model", verified=True, rank=len(results))
+                else: #not in the catalog: its ingredients can't be checked, so no saving is claimed
+                    results[title.lower()] = {
+                        "title": title,
+                        "link": f"https://www.google.com/search?q={quote_plus(title + ' recipe')}",
+                        "saved": 0.0,
+                        "used_ingredients": [],
+                        "missed_ingredients": [],
+                        "source": "model",
+                        "verified": False,
+                        "rank": len(results),
+                    }
+    return sorted(results.values(), key=lambda result: (-result["saved"], result["rank"]))[:limit]
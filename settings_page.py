@@ -1,12 +1,5 @@
 import streamlit as st
-
-#initialization of session state variables
-if "flate_name" not in st.session_state: #initlialize flat name if not set
-    st.session_state["flate_name"] = ""  
-if "roommates" not in st.session_state:  #initlialize roommate if not set
-    st.session_state["roommates"] = []
-if "setup_finished" not in st.session_state: # use to get to the initial setup
-    st.session_state["setup_finished"] = False
+from store_externally import delete_account
 
 #function for flat name setup
 def setup_flat_name():
@@ -80,10 +73,22 @@ def settingspage():
     manage_roommates() #manage roommates
 
 #settingspage main logic
-if not st.session_state["setup_finished"]: #check if setup not finished
-    if st.session_state["flate_name"] == "": #if no flat name is set up, start with flat name setup
-        setup_flat_name()
+def settings_main():
+    if not st.session_state["setup_finished"]: #check if setup not finished
+        if st.session_state["flate_name"] == "": #if no flat name is set up, start with flat name setup
+            setup_flat_name()
+        else:
+            setup_roommates() #if falt nanme is already set up proceed with setup of roommates
     else:
-        setup_roommates() #if falt nanme is already set up proceed with setup of roommates
-else:
-    settingspage() #show settingspage once setup is complete
+        settingspage() #show settingspage once setup is complete
+        delete_account() #option to delete account
+
+#run this page on its own for testing: streamlit run settings_page.py
+if __name__ == "__main__":
+    if "flate_name" not in st.session_state: #initlialize flat name if not set
+        st.session_state["flate_name"] = ""  
+    if "roommates" not in st.session_state:  #initlialize roommate if not set
+        st.session_state["roommates"] = []
+    if "setup_finished" not in st.session_state: # use to get to the initial setup
+        st.session_state["setup_finished"] = False
+    settings_main()
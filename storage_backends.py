@@ -0,0 +1,403 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+
+import storage_log #json snapshot + event log engine
+from user_directory import LEGACY_FILE, UserDirectory
+
+#pluggable storage for users and wg data
+#store_externally only talks to get_backend(), which returns the json files backend (default) or the sqlite backend
+#choose with the environment variable WASTELESS_STORAGE=json|sqlite, the sqlite file is set with WASTELESS_DB
+
+USERS_DIRECTORY = "users"
+DEFAULT_DB = "wasteless.db"
+
+_flat_locks = {} #sqlite backend: one thread lock per flat
+_flat_locks_guard = threading.Lock()
+
+#history tables and the keys/event kinds they belong to
+HISTORY_TABLES = {"purchases": "purchases", "consumed": "consumption"}
+EVENT_TABLES = {"purchase": "purchases", "consumption": "consumption"}
+
+
+#backend that keeps everything in json files (snapshot + event log per flat, one file per user)
+class JsonBackend:
+    def __init__(self, users_directory=USERS_DIRECTORY, directory="."):
+        self.directory = directory #where the flats' files are, users_directory is inside it
+        self.users = UserDirectory(os.path.join(directory, users_directory), os.path.join(directory, LEGACY_FILE))
+
+    def _flat(self, username):
+        return os.path.join(self.directory, username) #storage_log names the flat's files after this
+
+    def lock(self, username):
+        return storage_log.flat_lock(self._flat(username)) #thread lock + file lock for this flat only
+
+    def read_state(self, username):
+        return storage_log.read_state(self._flat(username))
+
+    def current_seq(self, username):
+        return storage_log.current_seq(self._flat(username))
+
+    def write_snapshot(self, username, data, seq):
+        return storage_log.write_snapshot(self._flat(username), data, seq)
+
+    def append_events(self, username, events):
+        """Return (new last event number, bytes written, last event number before); call it while holding lock()"""
+        disk_seq = storage_log.current_seq(self._flat(username)) #the file lock keeps other processes out until we're done
+        return (*storage_log.append_events(self._flat(username), events, disk_seq), disk_seq)
+
+    def needs_compaction(self, username):
+        return storage_log.log_length(self._flat(username)) >= storage_log.COMPACT_EVERY
+
+    def compact(self, username):
+        return storage_log.compact(self._flat(username))
+
+    def stored_bytes(self, username):
+        return storage_log.stored_bytes(self._flat(username))
+
+    def delete(self, username):
+        storage_log.delete_files(self._flat(username))
+
+    #users: one file per user, see user_directory.py
+    def has_users(self):
+        return self.users.has_users()
+
+    def get_password(self, username):
+        return self.users.get_password(username) #None if the user does not exist
+
+    def add_user(self, username, password):
+        """Return False if the username is taken"""
+        return self.users.add(username, password)
+
+    def remove_user(self, username):
+        self.users.remove(username)
+
+    #queries: the json backend has to load the whole history and filter it
+    def query_history(self, username, key, roommate=None, start=None, end=None, product=None, limit=None, offset=0):
+        data = self.read_state(username)[0]
+        rows = [
+            dict(entry, Roommate=mate)
+            for mate, entries in data.get(key, {}).items() if roommate is None or mate == roommate
+            for entry in entries
+            if (start is None or entry.get("Date", "") >= start)
+            and (end is None or entry.get("Date", "") < end)
+            and (product is None or entry.get("Product") == product)
+        ]
+        rows.sort(key=lambda row: row.get("Date", ""))
+        return rows[offset:None if limit is None else offset + limit]
+
+    def totals(self, username, key, group_by="Roommate", start=None, end=None):
+        result = {}
+        for row in self.query_history(username, key, start=start, end=end):
+            result[row[group_by]] = result.get(row[group_by], 0.0) + row.get("Price", 0)
+        return result
+
+
+#backend that keeps everything in one sqlite database with one row per inventory item and history entry
+class SqliteBackend:
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS users (username TEXT PRIMARY KEY, password TEXT NOT NULL);
+    CREATE TABLE IF NOT EXISTS flats (flat TEXT PRIMARY KEY, state TEXT NOT NULL DEFAULT '{}', seq INTEGER NOT NULL DEFAULT 0);
+    CREATE TABLE IF NOT EXISTS inventory (
+        flat TEXT NOT NULL, product TEXT NOT NULL, quantity REAL NOT NULL, unit TEXT, price REAL NOT NULL, entry TEXT,
+        PRIMARY KEY (flat, product));
+    CREATE TABLE IF NOT EXISTS expenses (flat TEXT NOT NULL, roommate TEXT NOT NULL, amount REAL NOT NULL, PRIMARY KEY (flat, roommate));
+    CREATE TABLE IF NOT EXISTS purchases (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, flat TEXT NOT NULL, roommate TEXT NOT NULL, product TEXT,
+        quantity REAL, unit TEXT, price REAL, date TEXT, entry TEXT NOT NULL);
+    CREATE INDEX IF NOT EXISTS purchases_by_roommate ON purchases (flat, roommate, date);
+    CREATE INDEX IF NOT EXISTS purchases_by_product ON purchases (flat, product);
+    CREATE TABLE IF NOT EXISTS consumption (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, flat TEXT NOT NULL, roommate TEXT NOT NULL, product TEXT,
+        quantity REAL, unit TEXT, price REAL, date TEXT, entry TEXT NOT NULL);
+    CREATE INDEX IF NOT EXISTS consumption_by_roommate ON consumption (flat, roommate, date);
+    CREATE INDEX IF NOT EXISTS consumption_by_product ON consumption (flat, product);
+    CREATE TABLE IF NOT EXISTS ratings (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, flat TEXT NOT NULL, person TEXT, recipe TEXT, rating INTEGER, date TEXT, entry TEXT NOT NULL);
+    CREATE INDEX IF NOT EXISTS ratings_by_person ON ratings (flat, person, date);
+    """
+
+    def __init__(self, path=DEFAULT_DB):
+        self.path = path
+        self._local = threading.local() #streamlit runs every session in its own thread -> one connection per thread
+        self._connection().executescript(self.SCHEMA)
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL") #readers don't block the writer
+            connection.execute("PRAGMA foreign_keys=ON")
+            self._local.connection = connection
+        return connection
+
+    @contextmanager
+    def lock(self, username):
+        with _flat_locks_guard:
+            thread_lock = _flat_locks.setdefault(username, threading.Lock())
+        with thread_lock: #other processes are kept out by sqlite's own transaction lock
+            yield
+
+    def current_seq(self, username):
+        row = self._connection().execute("SELECT seq FROM flats WHERE flat = ?", (username,)).fetchone()
+        return row[0] if row else 0
+
+    #reading and writing whole flats
+    def read_state(self, username):
+        db = self._connection()
+        row = db.execute("SELECT state, seq FROM flats WHERE flat = ?", (username,)).fetchone()
+        if row is None:
+            return {}, 0
+        data = json.loads(row[0])
+        data["inventory"] = {
+            product: dict(json.loads(entry) if entry else {}, Quantity=quantity, Unit=unit, Price=price)
+            for product, quantity, unit, price, entry in db.execute(
+                "SELECT product, quantity, unit, price, entry FROM inventory WHERE flat = ?", (username,))
+        }
+        data["expenses"] = dict(db.execute("SELECT roommate, amount FROM expenses WHERE flat = ?", (username,)).fetchall())
+        for key, table in HISTORY_TABLES.items():
+            history = {mate: [] for mate in data.pop(f"_{key}_mates", [])} #roommates without entries
+            for roommate, entry in db.execute(f"SELECT roommate, entry FROM {table} WHERE flat = ? ORDER BY id", (username,)):
+                history.setdefault(roommate, []).append(json.loads(entry))
+            data[key] = history
+        data["cooking_history"] = [
+            json.loads(entry) for (entry,) in db.execute("SELECT entry FROM ratings WHERE flat = ? ORDER BY id", (username,))
+        ]
+        return data, row[1]
+
+    def write_snapshot(self, username, data, seq):
+        db = self._connection()
+        with db: #one transaction
+            db.execute("BEGIN IMMEDIATE")
+            self._delete_flat_rows(db, username)
+            db.execute("INSERT INTO flats (flat, seq) VALUES (?, ?)", (username, seq))
+            for key, value in data.items():
+                self._put(db, username, key, value)
+        return self.stored_bytes(username)
+
+    def append_events(self, username, events):
+        """Return (new last event number, bytes written, last event number before), both read in the same transaction"""
+        db = self._connection()
+        written = 0
+        with db: #all events of one save in one transaction
+            db.execute("BEGIN IMMEDIATE") #take the write lock before reading the version
+            db.execute("INSERT OR IGNORE INTO flats (flat) VALUES (?)", (username,))
+            disk_seq = seq = db.execute("SELECT seq FROM flats WHERE flat = ?", (username,)).fetchone()[0]
+            for event in events:
+                seq += 1
+                event["seq"] = seq
+                written += len(json.dumps(event).encode("utf-8"))
+                self._apply(db, username, event)
+            db.execute("UPDATE flats SET seq = ? WHERE flat = ?", (seq, username))
+        return seq, written, disk_seq
+
+    def needs_compaction(self, username):
+        return False #rows are updated in place, there is no log to fold
+
+    def compact(self, username):
+        row = self._connection().execute("SELECT seq FROM flats WHERE flat = ?", (username,)).fetchone()
+        return row[0] if row else 0
+
+    def stored_bytes(self, username):
+        db = self._connection()
+        total = 0
+        for table in ("inventory", "purchases", "consumption", "ratings"):
+            total += db.execute(f"SELECT COALESCE(SUM(LENGTH(entry)), 0) FROM {table} WHERE flat = ?", (username,)).fetchone()[0]
+        row = db.execute("SELECT LENGTH(state) FROM flats WHERE flat = ?", (username,)).fetchone()
+        return total + (row[0] if row else 0)
+
+    def delete(self, username):
+        db = self._connection()
+        with db:
+            self._delete_flat_rows(db, username)
+
+    def _delete_flat_rows(self, db, username):
+        for table in ("flats", "inventory", "expenses", "purchases", "consumption", "ratings"):
+            db.execute(f"DELETE FROM {table} WHERE flat = ?", (username,))
+
+    def _insert_history(self, db, table, username, roommate, entry):
+        db.execute(
+            f"INSERT INTO {table} (flat, roommate, product, quantity, unit, price, date, entry) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (username, roommate, entry.get("Product"), entry.get("Quantity"), entry.get("Unit"),
+             entry.get("Price"), entry.get("Date"), json.dumps(entry)),
+        )
+
+    def _insert_rating(self, db, username, entry):
+        db.execute(
+            "INSERT INTO ratings (flat, person, recipe, rating, date, entry) VALUES (?, ?, ?, ?, ?, ?)",
+            (username, entry.get("Person"), entry.get("Recipe"), entry.get("Rating"), entry.get("Date"), json.dumps(entry)),
+        )
+
+    def _set_state(self, db, username, key, value):
+        state = json.loads(db.execute("SELECT state FROM flats WHERE flat = ?", (username,)).fetchone()[0])
+        state[key] = value
+        db.execute("UPDATE flats SET state = ? WHERE flat = ?", (json.dumps(state), username))
+
+    #function to replace one key completely
+    def _put(self, db, username, key, value):
+        if key in HISTORY_TABLES:
+            table = HISTORY_TABLES[key]
+            db.execute(f"DELETE FROM {table} WHERE flat = ?", (username,))
+            for roommate, entries in value.items():
+                for entry in entries:
+                    self._insert_history(db, table, username, roommate, entry)
+            self._set_state(db, username, f"_{key}_mates", list(value)) #keep roommates with an empty history
+        elif key == "cooking_history":
+            db.execute("DELETE FROM ratings WHERE flat = ?", (username,))
+            for entry in value:
+                self._insert_rating(db, username, entry)
+        elif key == "inventory":
+            db.execute("DELETE FROM inventory WHERE flat = ?", (username,))
+            for product, item in value.items():
+                extra = {k: v for k, v in item.items() if k not in ("Quantity", "Unit", "Price")}
+                db.execute(
+                    "INSERT INTO inventory (flat, product, quantity, unit, price, entry) VALUES (?, ?, ?, ?, ?, ?)",
+                    (username, product, item.get("Quantity", 0), item.get("Unit"), item.get("Price", 0), json.dumps(extra)),
+                )
+        elif key == "expenses":
+            db.execute("DELETE FROM expenses WHERE flat = ?", (username,))
+            db.executemany("INSERT INTO expenses (flat, roommate, amount) VALUES (?, ?, ?)",
+                           [(username, mate, amount) for mate, amount in value.items()])
+        else:
+            self._set_state(db, username, key, value)
+
+    #function to apply one event from storage_log to the tables
+    def _apply(self, db, username, event):
+        kind = event["kind"]
+        if kind in EVENT_TABLES:
+            self._insert_history(db, EVENT_TABLES[kind], username, event["mate"], event["entry"])
+            key = "purchases" if kind == "purchase" else "consumed"
+            state = json.loads(db.execute("SELECT state FROM flats WHERE flat = ?", (username,)).fetchone()[0])
+            if event["mate"] not in state.get(f"_{key}_mates", []):
+                self._set_state(db, username, f"_{key}_mates", state.get(f"_{key}_mates", []) + [event["mate"]])
+        elif kind == "rating":
+            self._insert_rating(db, username, event["entry"])
+        elif kind == "inventory":
+            if event.get("removed"):
+                db.execute("DELETE FROM inventory WHERE flat = ? AND product = ?", (username, event["item"]))
+                return
+            #the product's row is changed with the json log's own function: quantities and lots are merged in
+            #integer base units the same way, the lots live in the entry column next to the totals
+            row = db.execute("SELECT quantity, unit, price, entry FROM inventory WHERE flat = ? AND product = ?",
+                             (username, event["item"])).fetchone()
+            inventory = {}
+            if row is not None:
+                quantity, unit, price, entry = row
+                inventory[event["item"]] = dict(json.loads(entry) if entry else {}, Quantity=quantity, Unit=unit, Price=price)
+            storage_log.apply_event({"inventory": inventory}, event)
+            item = inventory[event["item"]]
+            extra = {k: v for k, v in item.items() if k not in ("Quantity", "Unit", "Price")}
+            db.execute(
+                "INSERT OR REPLACE INTO inventory (flat, product, quantity, unit, price, entry) VALUES (?, ?, ?, ?, ?, ?)",
+                (username, event["item"], item["Quantity"], item["Unit"], item["Price"], json.dumps(extra)),
+            )
+        elif kind == "expense":
+            db.execute(
+                """INSERT INTO expenses (flat, roommate, amount) VALUES (?, ?, ?)
+                   ON CONFLICT (flat, roommate) DO UPDATE SET amount = amount + excluded.amount""",
+                (username, event["mate"], event["amount"]),
+            )
+        elif kind == "put":
+            self._put(db, username, event["key"], event["value"])
+
+    #users
+    def has_users(self):
+        return self._connection().execute("SELECT 1 FROM users LIMIT 1").fetchone() is not None
+
+    def get_password(self, username):
+        row = self._connection().execute("SELECT password FROM users WHERE username = ?", (username,)).fetchone()
+        return row[0] if row else None
+
+    def add_user(self, username, password):
+        """Return False if the username is taken"""
+        db = self._connection()
+        try:
+            with db:
+                db.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, password))
+            return True
+        except sqlite3.IntegrityError: #primary key already exists
+            return False
+
+    def remove_user(self, username):
+        db = self._connection()
+        with db:
+            db.execute("DELETE FROM users WHERE username = ?", (username,))
+
+    #queries that only read the requested range
+    def query_history(self, username, key, roommate=None, start=None, end=None, product=None, limit=None, offset=0):
+        """Return history entries of one flat, filtered by roommate, date range [start, end) and product"""
+        sql = f"SELECT roommate, entry FROM {HISTORY_TABLES[key]} WHERE flat = ?"
+        params = [username]
+        if roommate is not None:
+            sql += " AND roommate = ?"
+            params.append(roommate)
+        if start is not None:
+            sql += " AND date >= ?"
+            params.append(start)
+        if end is not None:
+            sql += " AND date < ?"
+            params.append(end)
+        if product is not None:
+            sql += " AND product = ?"
+            params.append(product)
+        sql += " ORDER BY date, id LIMIT ? OFFSET ?"
+        params += [-1 if limit is None else limit, offset]
+        return [dict(json.loads(entry), Roommate=mate) for mate, entry in self._connection().execute(sql, params)]
+
+    def totals(self, username, key, group_by="Roommate", start=None, end=None):
+        """Return the summed price per roommate (or per product) for a date range"""
+        column = "roommate" if group_by == "Roommate" else "product"
+        sql = f"SELECT {column}, SUM(price) FROM {HISTORY_TABLES[key]} WHERE flat = ?"
+        params = [username]
+        if start is not None:
+            sql += " AND date >= ?"
+            params.append(start)
+        if end is not None:
+            sql += " AND date < ?"
+            params.append(end)
+        sql += f" GROUP BY {column}"
+        return dict(self._connection().execute(sql, params).fetchall())
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+#function to get the configured backend (one per process)
+def get_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            if os.environ.get("WASTELESS_STORAGE", "json") == "sqlite":
+                _backend = SqliteBackend(os.environ.get("WASTELESS_DB", DEFAULT_DB))
+            else:
+                _backend = JsonBackend()
+        return _backend
+
+
+#function to copy all users and flats from the json files into a sqlite database
+def migrate_json_to_sqlite(db_path=DEFAULT_DB, directory="."):
+    """One-shot migration, returns the number of migrated flats"""
+    source = JsonBackend(directory=directory)
+    target = SqliteBackend(db_path)
+    for username in source.users.usernames():
+        target.add_user(username, source.get_password(username))
+    names = os.listdir(directory)
+    flats = {name[:-len("_data.json")] for name in names if name.endswith("_data.json")}
+    flats |= {name[:-len("_events.jsonl")] for name in names if name.endswith("_events.jsonl")}
+    for username in sorted(flats):
+        data, seq = source.read_state(username)
+        target.write_snapshot(username, data, seq)
+    return len(flats)
+
+
+if __name__ == "__main__":
+    #usage: python storage_backends.py migrate [database file]
+    if len(sys.argv) >= 2 and sys.argv[1] == "migrate":
+        count = migrate_json_to_sqlite(sys.argv[2] if len(sys.argv) > 2 else DEFAULT_DB)
+        print(f"Migrated {count} flats.")
+    else:
+        print("usage: python storage_backends.py migrate [database file]")
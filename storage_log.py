@@ -0,0 +1,352 @@
+import json
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+
+import units #inventory changes are merged in integer base units
+
+try:
+    import fcntl #file locks between processes (not available on windows)
+except ImportError:
+    fcntl = None
+
+#append-only storage engine for the wg data
+#every flat has a snapshot file ({username}_data.json, same format as before) and an event log ({username}_events.jsonl)
+#auto_save only appends the changes since the last save to the log, load_data replays snapshot + log
+#writes are done under a per-flat lock, snapshots are replaced atomically (temp file + rename)
+
+COMPACT_EVERY = 200 #fold the log into a new snapshot after this many events
+SEQ_KEY = "_log_seq" #key inside the snapshot that remembers the last event already folded into it
+
+#keys whose lists only grow -> new entries become append events
+HISTORY_KEYS = {"purchases": "purchase", "consumed": "consumption"}
+
+#fsync after every write (WASTELESS_FSYNC=0 trades crash safety for speed)
+FSYNC = os.environ.get("WASTELESS_FSYNC", "1") != "0"
+
+_flat_locks = {} #one thread lock per flat, so different flats never wait for each other
+_flat_locks_guard = threading.Lock()
+
+
+def snapshot_file(username):
+    return f"{username}_data.json" #same file name as the old whole-file save
+
+
+def log_file(username):
+    return f"{username}_events.jsonl" #one json event per line
+
+
+def lock_file(username):
+    return f"{username}.lock"
+
+
+#function to lock one flat against other sessions (threads) and other server processes
+@contextmanager
+def flat_lock(username):
+    with _flat_locks_guard:
+        thread_lock = _flat_locks.setdefault(username, threading.Lock())
+    with thread_lock:
+        if fcntl is None:
+            yield
+            return
+        with open(lock_file(username), "a") as file:
+            fcntl.flock(file, fcntl.LOCK_EX) #released when the file is closed
+            yield
+
+
+#function to replace a file so that readers see either the old or the new content, never half of it
+def atomic_write(path, text, fsync=None):
+    fsync = FSYNC if fsync is None else fsync
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp" #same directory -> rename stays atomic
+    try:
+        with open(temp_path, "w") as file:
+            file.write(text)
+            file.flush()
+            if fsync:
+                os.fsync(file.fileno()) #content is on disk before the rename
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    if fsync and hasattr(os, "O_DIRECTORY"): #make the rename itself durable
+        directory = os.open(os.path.dirname(os.path.abspath(path)), os.O_DIRECTORY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+
+
+#function to apply a single event to a data dictionary
+def apply_event(data, event):
+    """Apply one logged change to the data dict (in place)"""
+    kind = event["kind"]
+    if kind in ("purchase", "consumption"): #new entry in a roommate's history
+        key = "purchases" if kind == "purchase" else "consumed"
+        data.setdefault(key, {}).setdefault(event["mate"], []).append(event["entry"])
+    elif kind == "rating": #new entry in the cooking history
+        data.setdefault("cooking_history", []).append(event["entry"])
+    elif kind == "inventory": #quantity/price change of one product
+        inventory = data.setdefault("inventory", {})
+        if event.get("removed"): #product is gone from the fridge
+            inventory.pop(event["item"], None)
+            return
+        item = inventory.setdefault(event["item"], {"Quantity": 0, "Unit": event.get("unit"), "Price": 0})
+        if "lots" in event: #before the totals change: products saved without lots become one lot of their totals
+            apply_lot_changes(item, event["lots"])
+        item["Quantity"] = add_quantity(item["Quantity"], event.get("quantity", 0), item["Unit"])
+        item["Price"] += event.get("price", 0)
+        if event.get("unit") is not None:
+            item["Unit"] = event["unit"]
+    elif kind == "expense": #change of a roommate's total expenses
+        expenses = data.setdefault("expenses", {})
+        expenses[event["mate"]] = expenses.get(event["mate"], 0.0) + event["amount"]
+    elif kind == "put": #everything else is simply overwritten
+        data[event["key"]] = event["value"]
+
+
+#function to get the lots of a stored product, products saved before lots existed become one lot without dates
+def item_lots(item):
+    """Lots saved without an id get "legacy-<position>", the same id in every session and in the log"""
+    if "Lots" not in item:
+        item["Lots"] = [{"Quantity": item["Quantity"], "Price": item["Price"], "Bought": None, "Expiry": None}] if item["Quantity"] > 0 else []
+    for position, lot in enumerate(item["Lots"]):
+        lot.setdefault("Id", f"legacy-{position}")
+    return item["Lots"]
+
+
+#function to compare the lots of one product: new lots completely, changed ones as differences (like the totals)
+def lot_changes(before, after):
+    """Return {"added": [lots], "changed": {lot id: [quantity, price]}} or None if no lot changed"""
+    old = {lot["Id"]: lot for lot in before}
+    new = {lot["Id"]: lot for lot in after}
+    added = [lot for lot_id, lot in new.items() if lot_id not in old]
+    changed = {}
+    for lot_id, lot in old.items():
+        now = new.get(lot_id, {"Quantity": 0, "Price": 0}) #a used up lot is a change to zero
+        if (now["Quantity"], now["Price"]) != (lot["Quantity"], lot["Price"]):
+            changed[lot_id] = [now["Quantity"] - lot["Quantity"], now["Price"] - lot["Price"]]
+    return {"added": added, "changed": changed} if added or changed else None
+
+
+#function to add a quantity difference in integer base units of the product's unit: differences merged from several
+#sessions add up exactly (1 - 0.3 - 0.7 liters is 0, not 5.6e-17), so a used up lot is exactly empty
+def add_quantity(quantity, difference, unit):
+    factor = units.base_factor(unit)
+    return (round(quantity * factor) + round(difference * factor)) / factor
+
+
+#function to apply lot changes to a stored product (in place), so lots merge like the totals and add up to them
+def apply_lot_changes(item, changes):
+    if isinstance(changes, list): #events written before lots had ids carry the whole list
+        item["Lots"] = changes
+        return
+    lots = item_lots(item)
+    by_id = {lot["Id"]: lot for lot in lots}
+    for lot in changes.get("added", []):
+        if lot["Id"] not in by_id:
+            by_id[lot["Id"]] = dict(lot)
+            lots.append(by_id[lot["Id"]])
+    for lot_id, (quantity, price) in changes.get("changed", {}).items():
+        if lot_id in by_id: #a lot another session used up is already gone
+            by_id[lot_id]["Quantity"] = add_quantity(by_id[lot_id]["Quantity"], quantity, item.get("Unit"))
+            by_id[lot_id]["Price"] += price
+    item["Lots"] = [lot for lot in lots if lot["Quantity"] > 0]
+
+
+#function to build a small copy of one persisted value that is enough to find changes later
+def shadow_value(key, value):
+    if key in HISTORY_KEYS: #histories only need their length
+        return {mate: len(entries) for mate, entries in value.items()}
+    if key == "cooking_history":
+        return len(value)
+    if key == "inventory": #lots are copied too, they are changed in place
+        return {item: dict(values, Lots=[dict(lot) for lot in values["Lots"]]) if "Lots" in values else dict(values)
+                for item, values in value.items()}
+    if key == "expenses":
+        return dict(value)
+    return json.dumps(value, sort_keys=True) #small keys are compared by their json text
+
+
+#function to build the shadow of the whole persisted state
+def make_shadow(data):
+    """Remember what is on disk without copying the whole history"""
+    return {key: shadow_value(key, value) for key, value in data.items() if key != SEQ_KEY}
+
+
+#function to compare one key with its shadow and return the changes as events
+def key_events(key, old, value):
+    """Return the events that turn the shadow of one key into value"""
+    if old is None: #key was never saved
+        return [{"kind": "put", "key": key, "value": value}]
+
+    if key in HISTORY_KEYS: #purchases and consumption: only new entries are written
+        if any(mate not in value or len(value[mate]) < length for mate, length in old.items()):
+            return [{"kind": "put", "key": key, "value": value}] #history was rewritten -> store it completely
+        return [
+            {"kind": HISTORY_KEYS[key], "mate": mate, "entry": entry}
+            for mate, entries in value.items()
+            for entry in entries[old.get(mate, 0):]
+        ]
+
+    if key == "cooking_history":
+        if len(value) < old:
+            return [{"kind": "put", "key": key, "value": value}]
+        return [{"kind": "rating", "entry": entry} for entry in value[old:]]
+
+    if key == "inventory": #store the difference in quantity and price per product
+        events = [{"kind": "inventory", "item": item, "removed": True} for item in old if item not in value]
+        for item, new in value.items():
+            before = old.get(item, {"Quantity": 0, "Unit": None, "Price": 0})
+            if new != before:
+                event = {
+                    "kind": "inventory",
+                    "item": item,
+                    "quantity": new.get("Quantity", 0) - before.get("Quantity", 0),
+                    "price": new.get("Price", 0) - before.get("Price", 0),
+                    "unit": new.get("Unit"),
+                }
+                if "Lots" in new: #only what changed per lot, so two sessions using different lots both count
+                    old_lots = item_lots({**before, "Lots": [dict(lot) for lot in before["Lots"]]} if "Lots" in before else dict(before))
+                    changes = lot_changes(old_lots, item_lots(new))
+                    if changes:
+                        event["lots"] = changes
+                events.append(event)
+        return events
+
+    if key == "expenses": #store the difference per roommate
+        if any(mate not in value for mate in old):
+            return [{"kind": "put", "key": key, "value": value}]
+        return [
+            {"kind": "expense", "mate": mate, "amount": amount - old.get(mate, 0.0)}
+            for mate, amount in value.items()
+            if amount != old.get(mate, 0.0)
+        ]
+
+    if old != json.dumps(value, sort_keys=True): #all other keys are small and simply overwritten
+        return [{"kind": "put", "key": key, "value": value}]
+    return []
+
+
+#function to compare the current data with the shadow and return the changes as events
+def diff_events(shadow, data, keys=None):
+    """Return the list of events that turn the shadow into data (only for keys, if given)"""
+    events = []
+    for key in (data if keys is None else keys):
+        events.extend(key_events(key, shadow.get(key), data[key]))
+    return events
+
+
+#function to get a cheap structural fingerprint of a value
+def fingerprint(value):
+    """Changes whenever a persisted value changes, without serializing it"""
+    if isinstance(value, dict):
+        return tuple((key, fingerprint(item)) for key, item in value.items())
+    if isinstance(value, list):
+        if len(value) <= 32: #short lists (roommates, suggestions) are compared completely
+            return tuple(fingerprint(item) for item in value)
+        #long histories only grow at the end or are replaced as a whole (login, merge, reset): the fingerprint holds
+        #the list itself, the same list is found equal by identity without walking it, a replaced one by its content
+        return (value, len(value), fingerprint(value[-1]))
+    return value
+
+
+#function to read the snapshot and replay the log
+def read_state(username):
+    """Return (data, last event number) for a flat"""
+    data = {}
+    if os.path.exists(snapshot_file(username)):
+        with open(snapshot_file(username), "r") as file:
+            data = json.load(file)
+    seq = data.pop(SEQ_KEY, 0) #old snapshots have no sequence number
+    if os.path.exists(log_file(username)):
+        with open(log_file(username), "r") as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                try:
+                    event = json.loads(line)
+                except ValueError: #half written line after a crash -> ignore it
+                    continue
+                if event["seq"] <= seq: #already part of the snapshot
+                    continue
+                apply_event(data, event)
+                seq = event["seq"]
+    return data, seq
+
+
+#function to get the number of the last event on disk
+def current_seq(username):
+    """Read only the end of the log, the snapshot only if the log is empty"""
+    if os.path.exists(log_file(username)) and os.path.getsize(log_file(username)) > 0:
+        with open(log_file(username), "rb") as file:
+            file.seek(max(os.path.getsize(log_file(username)) - 65536, 0)) #events are small, the last one is in here
+            for line in reversed(file.read().splitlines()):
+                try:
+                    return json.loads(line)["seq"]
+                except ValueError: #torn line -> look at the one before
+                    continue
+    return read_state(username)[1]
+
+
+#function to write a full snapshot and empty the log (call it while holding flat_lock)
+def write_snapshot(username, data, seq):
+    snapshot = dict(data)
+    snapshot[SEQ_KEY] = seq #remember which events are already inside
+    text = json.dumps(snapshot)
+    atomic_write(snapshot_file(username), text) #a crash leaves the old snapshot, never a truncated one
+    if os.path.exists(log_file(username)):
+        os.remove(log_file(username)) #events are in the snapshot now
+    return len(text.encode("utf-8")) #bytes written
+
+
+#function to append events to the log (call it while holding flat_lock)
+def append_events(username, events, seq):
+    """Write the events to the log and return (new last event number, bytes written)"""
+    lines = []
+    for event in events:
+        seq += 1
+        event["seq"] = seq #number every event so replays can skip the ones already in the snapshot
+        lines.append(json.dumps(event) + "\n")
+    text = "".join(lines)
+    with open(log_file(username), "a+b") as file:
+        if file.tell() > 0: #a crash may have left a line without its newline -> don't glue onto it
+            file.seek(-1, os.SEEK_END)
+            if file.read(1) != b"\n":
+                text = "\n" + text
+        file.write(text.encode("utf-8")) #one write for all events of a save
+        file.flush()
+        if FSYNC:
+            os.fsync(file.fileno())
+    return seq, len(text.encode("utf-8"))
+
+
+#function to fold the log into the snapshot when it got long (call it while holding flat_lock)
+def compact(username):
+    """Replace snapshot + log by a new snapshot"""
+    data, seq = read_state(username) #rebuilt from disk, not from a session
+    write_snapshot(username, data, seq)
+    return seq
+
+
+#function to get the size of all files of a flat
+def stored_bytes(username):
+    return sum(os.path.getsize(path) for path in (snapshot_file(username), log_file(username)) if os.path.exists(path))
+
+
+#function to count the events in the log
+def log_length(username):
+    if not os.path.exists(log_file(username)):
+        return 0
+    with open(log_file(username), "r") as file:
+        return sum(1 for line in file if line.strip())
+
+
+#function to remove all files of a flat
+def delete_files(username):
+    #the lock file stays: a process waiting for the lock on the removed file and one that creates a new lock file
+    #would both get "the" lock; it is empty, and a flat registered again with the same name uses it again
+    for path in (snapshot_file(username), log_file(username)):
+        if os.path.exists(path):
+            os.remove(path)
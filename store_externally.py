@@ -1,74 +1,26 @@
 import streamlit as st
-import json
-import os
-from settings_page import setup_flat_name, setup_roommates, settingspage
-from fridge_page import fridge_page
-from barcode_page import barcode_page
-from recipe_page import recipepage
-
-
-#ensure all session state variables are initialized
-if "flate_name" not in st.session_state:
-    st.session_state["flate_name"] = "" #store name of flat
-if "roommates" not in st.session_state: #store list of roomates
-    st.session_state["roommates"] = []
-if "setup_finished" not in st.session_state: #track if setup of flat is complete
-    st.session_state["setup_finished"] = False
-if "page" not in st.session_state:
-    st.session_state["page"] = "settings" #app starts on settings page so that roomates can be registered
-if "inventory" not in st.session_state:
-    st.session_state["inventory"] = {} # track items in fridge
-if "expenses" not in st.session_state:#track expenses
-    st.session_state["expenses"] = {}
-if "purchases" not in st.session_state:#track individual purchases
-    st.session_state["purchases"] = {}
-if "consumed" not in st.session_state:#track consumed items
-    st.session_state["consumed"] = {}
-if "recipe_suggestions" not in st.session_state:#track a list
-    st.session_state["recipe_suggestions"] = []
-if "selected_recipe" not in st.session_state: #track currently selected recipe
-    st.session_state["selected_recipe"] = None
-if "selected_recipe_link" not in st.session_state: #store link for currently selected recipe
-    st.session_state["selected_recipe_link"] = None
-if "cooking_history" not in st.session_state: #keep record of cooked meals
-    st.session_state["cooking_history"] = []
-if "recipe_links" not in st.session_state: #track all recipe names and their links
-    st.session_state["recipe_links"] = {}
-if "logged_in" not in st.session_state:
-    st.session_state["logged_in"] = False
-if "username" not in st.session_state:
-    st.session_state["username"] = None
-if "data" not in st.session_state:
-    st.session_state["data"] = {}
-
-#register user and save user in json
+import storage_log #append-only log + snapshot for the wg data
+from storage_backends import get_backend #json files or sqlite, see storage_backends.py
+import figure_cache #cached overview charts of each flat
+
+
 def register_user(username, password): #function takes two arguments
-    if os.path.exists("users.json"): #checks if there's already a file with the name of the user
-        with open("users.json", "r") as file: #opens data in read modus ("r") and closes it afterwards immediately
-            users = json.load(file) #load file a content into users -> change to python
+    if get_backend().add_user(username, password): #adds the user, False if the username is taken
+        return True #signal successful registration
     else:
-        users = {} #if user doen't exist create an empty dictionary
-
-    if username in users: #check if username already exists
         st.error("Username already exists!")#show an error message if user already exists
         return False #stop the function
-    else:
-        users[username] = password # #if username doesn't exist, add a new dictionary, username will be key
-        with open("users.json", "w") as file: #ppens file in write modus. "w" -> overwrite with new data
-            json.dump(users, file) # #save/write dictionary into file
-        return True #signal successful registration
 
 #function for user login
 def login_user(username, password):
-    if os.path.exists("users.json"):#check if file exists
-        with open("users.json", "r") as file: #open in read mode
-            users = json.load(file) #load user
-    else:
+    backend = get_backend()
+    if not backend.has_users():#check if any user exists
         st.error("No users found! Please sign up first.") #if user not found instrution to register
         return False #stop function
     
     #checks if the user name exist and the password ist the right, if true then load the data
-    if username in users and users[username] == password: 
+    stored_password = backend.get_password(username) #None if user doesn't exist
+    if stored_password is not None and stored_password == password: 
         st.session_state["logged_in"] = True #mark user as logged in
         st.session_state["username"] = username #save username
         st.session_state.update(load_data(username)) #updates account data
@@ -79,18 +31,58 @@ def login_user(username, password):
 
 #function for savin Wg data like roommates,fridge inventory, etc in Json File
 def save_data(username, data):
-    data_file = f"{username}_data.json" #create file based on the user
-    with open(data_file, "w") as file: #open file in "write mode (w)", so that existing content can be replace
-        json.dump(data, file) #turn and save data into json format
+    backend = get_backend()
+    with backend.lock(username): #no other session of this flat writes at the same time
+        seq = backend.current_seq(username) #number of the last event on disk
+        written = backend.write_snapshot(username, data, seq) #write everything as a new snapshot and clear the log
+    st.session_state["log_seq"] = seq
+    st.session_state["persisted_shadow"] = storage_log.make_shadow(data) #remember the new disk state
+    st.session_state["stored_bytes"] = written
+    return written
+
+#function to save only the changes since the last save
+def save_changes(username, data, keys=None):
+    """Append the changes of the given keys to the log, return the number of bytes written"""
+    backend = get_backend()
+    shadow = st.session_state.get("persisted_shadow")
+    if shadow is None: #nothing known about the disk state -> full save
+        return save_data(username, data)
+    events = storage_log.diff_events(shadow, data, keys) #find what changed
+    if not events:
+        for key in (data if keys is None else keys):
+            shadow[key] = storage_log.shadow_value(key, data[key])
+        return 0
+    merged = None
+    with backend.lock(username): #only this flat is locked, other flats save in parallel
+        #append only the changes; disk_seq is read where they are written (sqlite: same transaction), so no other
+        #process can save in between unnoticed
+        seq, written, disk_seq = backend.append_events(username, events)
+        if backend.needs_compaction(username): #log got long -> fold into snapshot
+            backend.compact(username)
+        if disk_seq != st.session_state.get("log_seq", 0): #another session saved in between
+            merged, seq = backend.read_state(username) #their changes + ours (changes are deltas, so both survive)
+        stored = backend.stored_bytes(username)
+    st.session_state["log_seq"] = seq
+    st.session_state["stored_bytes"] = stored
+    if merged is not None: #show the merged data in this session too
+        st.session_state.update(merged)
+        st.session_state["data"] = merged
+        st.session_state["persisted_shadow"] = storage_log.make_shadow(merged)
+        st.session_state["save_fingerprints"] = {key: storage_log.fingerprint(value) for key, value in merged.items()}
+        return written
+    for key in (data if keys is None else keys): #remember the new disk state of the saved keys
+        shadow[key] = storage_log.shadow_value(key, data[key])
+    return written
 
 # Function to load Wg data when user logs in from Json file
 def load_data(username):
-    data_file = f"{username}_data.json" #genrate file named after username
-    if os.path.exists(data_file):
-        with open(data_file, "r") as file: # Opens file in read modus
-            return json.load(file) #return loaded data
-    else:
-        return {} #return empty dic. -> if file doesnt exist
+    backend = get_backend()
+    data, seq = backend.read_state(username) #snapshot + replay of the event log (or rows from sqlite)
+    st.session_state["log_seq"] = seq
+    st.session_state["persisted_shadow"] = storage_log.make_shadow(data) #remember what is on disk
+    st.session_state["save_fingerprints"] = {key: storage_log.fingerprint(value) for key, value in data.items()}
+    st.session_state["stored_bytes"] = backend.stored_bytes(username) #size a whole-file rewrite would cost
+    return data
 
 #function to sign in or sign up, displays only if not alreay signed in 
 def authentication():
@@ -132,7 +124,31 @@ def auto_save():
             "cooking_history": st.session_state.get("cooking_history", []),
             "recipe_links": st.session_state.get("recipe_links", {})
         }
-        save_data(st.session_state["username"], st.session_state["data"]) #function for saving user-data in a JSON file 
+
+        #dirty tracking: only keys whose fingerprint changed since the last save are written
+        fingerprints = st.session_state.setdefault("save_fingerprints", {})
+        versions = st.session_state.setdefault("save_versions", {}) #counts the changes per key
+        dirty = {} #key -> new fingerprint
+        for key, value in st.session_state["data"].items():
+            current = storage_log.fingerprint(value)
+            if key not in fingerprints or fingerprints[key] != current:
+                dirty[key] = current
+
+        stats = st.session_state.setdefault("save_stats", {"written": 0, "skipped": 0}) #running totals in bytes
+        full_size = st.session_state.get("stored_bytes", 0) #what rewriting the whole file would have cost
+        if not dirty: #nothing changed -> no serialization and no disk access
+            stats["skipped"] += full_size
+            stats["last"] = {"written": 0, "skipped": full_size}
+            return
+        written = save_changes(st.session_state["username"], st.session_state["data"], list(dirty)) #append the changes to the user's event log
+        #only now the keys count as saved: if the save raised, they are still dirty and written on the next rerun
+        if st.session_state.get("save_fingerprints") is fingerprints: #after a merge they were set from the merged data
+            fingerprints.update(dirty)
+        for key in dirty:
+            versions[key] = versions.get(key, 0) + 1
+        stats["written"] += written
+        stats["skipped"] += max(full_size - written, 0)
+        stats["last"] = {"written": written, "skipped": max(full_size - written, 0)}
 
 
 
@@ -150,65 +166,11 @@ def delete_account():
 def delete_data():
     username = st.session_state.get("username") #get logged in username
     if username:
-        if os.path.exists("users.json"): #check if users json file exists
-            with open("users.json", "r") as file: #opens data in read modus
-                users = json.load(file) #load the user
-            if username in users:
-                del users[username] #removes user from dictionary
-                with open("users.json", "w") as file: # Opens the file in write mode and overwrites the data
-                    json.dump(users, file) #save updated users
+        backend = get_backend()
+        backend.remove_user(username) #removes user from the user list
         
-        # Removing the user-specific data file: inventory, expenses...
-        data_file = f"{username}_data.json" #generate users data file 
-        if os.path.exists(data_file): #check if file exists
-            os.remove(data_file) #delete users data file
+        # Removing the user-specific data: inventory, expenses...
+        with backend.lock(username):
+            backend.delete(username) #delete snapshot and event log (or the flat's rows)
+        figure_cache.invalidate(username) #a new flat with this name starts again at log position 0
     st.session_state.clear() #clear session state data
-        
-
-#logic of main page
-if st.session_state["logged_in"]: #show main content and sidebar only when logged in
-
-    st.sidebar.title("Navigation") #sidebar title
-    if st.sidebar.button("Overview"):
-        st.session_state["page"] = "overview"
-    if st.sidebar.button("Fridge"):
-        st.session_state["page"] = "fridge"
-    if st.sidebar.button("Scan"):
-        st.session_state["page"] = "scan"
-    if st.sidebar.button("Recipes"):
-        st.session_state["page"] = "recipes"
-    if st.sidebar.button("Settings"):
-        st.session_state["page"] = "settings"
-    if st.sidebar.button("Log Out", type="primary"): #log out button
-        st.session_state["logged_in"] = False #log user out
-        st.session_state["username"] = None #clear username
-        st.session_state["data"] = {} #clear data
-
-    #page logic for selected page (sidebar)
-    if st.session_state["page"] == "overview":
-        st.title(f"Overview: {st.session_state['flate_name']}") #show overview page
-        st.write("Welcome to your WG overview page!") #Welcome message
-        auto_save()  #save data automatically
-    elif st.session_state["page"] == "fridge": #show fridge page
-        fridge_page()
-        auto_save()  #save data automatically
-    elif st.session_state["page"] == "scan": #show barcode scanning page
-        barcode_page()
-        auto_save()  #save data automatically
-    elif st.session_state["page"] == "recipes": #show recipe page
-        recipepage()
-        auto_save()  #save data automatically
-    elif st.session_state["page"] == "settings":
-        if not st.session_state["setup_finished"]: #check if setup complete
-            if st.session_state["flate_name"] == "":
-                setup_flat_name() #show wg name setup page
-            else:
-                setup_roommates() #show roommate setup page
-        else:
-            settingspage() #show settingspage
-            delete_account() #option to delete account
-        auto_save()  #save automatically
-else:
-    st.title("Wasteless") #show app title
-    st.write("Please sign in or sign up to continue.") #message for users authenticated
-    authentication() #show authentication options
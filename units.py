@@ -0,0 +1,144 @@
+from collections import namedtuple
+
+import numpy as np
+
+from recipe_index import normalize #same product names as the inventory index
+
+#unit registry: every unit name the app or a recipe uses -> dimension and factor to the dimension's base unit
+#base units are small integers: milligrams, microliters and thousandths of a piece, so sums of quantities are exact
+#(0.1 + 0.2 liters is 300000 microliters) and whole columns of quantities can be converted with one multiplication
+#grams <-> liters needs the product's density, pieces <-> grams its weight per piece (tables below)
+
+MASS, VOLUME, COUNT = "mass", "volume", "count"
+BASE_UNITS = {MASS: "mg", VOLUME: "ul", COUNT: "milli-piece"}
+
+Unit = namedtuple("Unit", ["name", "dimension", "factor"]) #factor = base units per unit
+
+#unit -> (dimension, base units per unit); names are matched without case, a trailing "s" or "."
+UNITS = {
+    "mg": (MASS, 1), "milligram": (MASS, 1),
+    "g": (MASS, 1_000), "gr": (MASS, 1_000), "gram": (MASS, 1_000), "gramm": (MASS, 1_000),
+    "kg": (MASS, 1_000_000), "kilogram": (MASS, 1_000_000), "kilo": (MASS, 1_000_000),
+    "oz": (MASS, 28_350), "ounce": (MASS, 28_350), "lb": (MASS, 453_592), "pound": (MASS, 453_592),
+    "ml": (VOLUME, 1_000), "milliliter": (VOLUME, 1_000), "millilitre": (VOLUME, 1_000),
+    "cl": (VOLUME, 10_000), "dl": (VOLUME, 100_000),
+    "l": (VOLUME, 1_000_000), "liter": (VOLUME, 1_000_000), "litre": (VOLUME, 1_000_000),
+    "tsp": (VOLUME, 4_929), "teaspoon": (VOLUME, 4_929), "tbsp": (VOLUME, 14_787), "tablespoon": (VOLUME, 14_787),
+    "cup": (VOLUME, 236_588),
+    "piece": (COUNT, 1_000), "pc": (COUNT, 1_000), "pcs": (COUNT, 1_000), "stk": (COUNT, 1_000), "stück": (COUNT, 1_000),
+    "clove": (COUNT, 1_000), "slice": (COUNT, 1_000), "can": (COUNT, 1_000), "pack": (COUNT, 1_000),
+    "dozen": (COUNT, 12_000),
+}
+
+FREE_FORM_FACTOR = 1000 #base units per unit for unit names the registry doesn't know (only the same name adds up)
+
+#units offered in the forms
+CHOICES = ["Pieces", "Grams", "Kilograms", "Milliliters", "Liters"]
+
+#grams per milliliter (normalized product names)
+DENSITY = {
+    "milk": 1.03, "cream": 1.01, "water": 1.0, "olive oil": 0.91, "oil": 0.92, "vegetable oil": 0.92,
+    "soy sauce": 1.2, "lemon juice": 1.03, "coconut milk": 0.97, "beef broth": 1.0, "vegetable broth": 1.0,
+    "flour": 0.53, "sugar": 0.85, "rice": 0.85, "butter": 0.91, "honey": 1.42, "yogurt": 1.03,
+    "cocoa powder": 0.5, "salsa": 1.05, "caesar dressing": 1.0,
+}
+
+#grams per piece (normalized product names)
+PIECE_WEIGHT = {
+    "egg": 60, "onion": 150, "garlic": 5, "tomato": 120, "banana": 120, "apple": 180, "potato": 170,
+    "carrot": 60, "lime": 65, "lemon": 100, "avocado": 200, "bell pepper": 150, "cabbage": 900,
+    "broccoli": 350, "tortilla": 40, "bread": 500, "celery": 400, "romaine lettuce": 600, "cucumber": 300,
+}
+
+
+def _key(name):
+    name = " ".join(str(name).lower().replace(".", "").split())
+    if name in UNITS:
+        return name
+    if name.endswith("s") and name[:-1] in UNITS: #grams, liters, pieces
+        return name[:-1]
+    return name
+
+
+_parsed = {} #unit name as written -> Unit, filled on first use of each spelling
+
+
+#function to look up a unit ("Grams", "g", "Liter" ...), ValueError for unknown units
+def parse(unit):
+    found = _parsed.get(unit)
+    if found is None:
+        key = _key(unit)
+        if key not in UNITS:
+            raise ValueError(f"Unknown unit: {unit}")
+        found = _parsed[unit] = Unit(unit, *UNITS[key])
+    return found
+
+
+def is_known(unit):
+    try:
+        parse(unit)
+        return True
+    except ValueError:
+        return False
+
+
+#functions to convert between a unit and integer base units
+def to_base(quantity, unit):
+    return int(round(quantity * parse(unit).factor))
+
+
+def from_base(amount, unit):
+    return amount / parse(unit).factor
+
+
+#function to get the base units per unit of a stored product, also for free-form unit names from older data
+def base_factor(unit):
+    return parse(unit).factor if is_known(unit) else FREE_FORM_FACTOR
+
+
+#function to get the factor from one dimension's base unit to another for a product (None if unknown)
+def _cross_factor(product, source, target):
+    if source == target:
+        return 1.0
+    name = normalize(product) if product else None
+    grams_per_ml = DENSITY.get(name)
+    grams_per_piece = PIECE_WEIGHT.get(name)
+    #mg per microliter is the density in g/ml, mg per thousandth of a piece is the piece weight in g
+    to_mass = {MASS: 1.0, VOLUME: grams_per_ml, COUNT: grams_per_piece} #mg per base unit of each dimension
+    if to_mass[source] is None or to_mass[target] is None:
+        return None
+    return to_mass[source] / to_mass[target]
+
+
+#function to convert a quantity, across dimensions with the product's density or piece weight
+def convert(quantity, from_unit, to_unit, product=None):
+    """Return quantity in to_unit, ValueError if the units can't be converted for this product"""
+    return from_base(to_base_of(quantity, from_unit, to_unit, product), to_unit)
+
+
+#function to convert to the base units of another unit's dimension, exact integer result
+def to_base_of(quantity, from_unit, to_unit, product=None):
+    """Integer amount in the base unit of to_unit's dimension (to add it to a product stored in to_unit)"""
+    source, target = parse(from_unit), parse(to_unit)
+    factor = _cross_factor(product, source.dimension, target.dimension)
+    if factor is None:
+        raise ValueError(f"Can't convert {from_unit} of {product or 'this product'} to {to_unit}.")
+    return int(round(to_base(quantity, from_unit) * factor))
+
+
+#function to get the base units per unit for a list of unit names, -1 for names the registry doesn't know
+def factors(unit_names):
+    return np.array([parse(name).factor if is_known(name) else -1 for name in unit_names], dtype=np.int64)
+
+
+#function to convert a whole column of quantities with a column of unit names to base units in one step
+def base_amounts(quantities, unit_names):
+    """int64 array of base units; units that are not known give -1"""
+    names, positions = np.unique(np.asarray(unit_names, dtype=object).astype(str), return_inverse=True)
+    per_row = factors(names)[positions] #one registry lookup per distinct unit
+    amounts = np.rint(np.asarray(quantities, dtype=np.float64) * per_row).astype(np.int64)
+    return np.where(per_row < 0, -1, amounts)
+
+
+def dimension(unit):
+    return parse(unit).dimension
@@ -0,0 +1,68 @@
+import json
+import os
+import uuid
+from urllib.parse import quote, unquote
+
+#user directory for the json backend: one small file per user instead of one big users.json
+#lookups open a single file (no parsing of all users), inserts and deletes touch only that file
+#and are atomic, so two flats signing up at the same moment can't overwrite each other
+
+LEGACY_FILE = "users.json"
+
+
+class UserDirectory:
+    def __init__(self, directory="users", legacy_file=LEGACY_FILE):
+        self.directory = directory
+        self.legacy_file = legacy_file
+        os.makedirs(directory, exist_ok=True)
+        self._import_legacy_file()
+
+    def _path(self, username):
+        return os.path.join(self.directory, quote(username, safe="") + ".json") #quote -> any username is a valid file name
+
+    #function to take over the users of an old users.json once
+    def _import_legacy_file(self):
+        if not os.path.exists(self.legacy_file):
+            return
+        with open(self.legacy_file, "r") as file:
+            users = json.load(file)
+        for username, password in users.items():
+            self.add(username, password) #already imported users are skipped
+        try:
+            os.replace(self.legacy_file, self.legacy_file + ".migrated") #keep a copy, but don't import it again
+        except FileNotFoundError: #another process was faster
+            pass
+
+    def get_password(self, username):
+        """Return the stored password, None if the user doesn't exist"""
+        try:
+            with open(self._path(username), "r") as file:
+                return json.load(file)["password"]
+        except FileNotFoundError:
+            return None
+
+    def add(self, username, password):
+        """Insert one user atomically, return False if the username is taken"""
+        temp_path = os.path.join(self.directory, f".{uuid.uuid4().hex}.tmp")
+        with open(temp_path, "w") as file: #write the complete record first...
+            json.dump({"username": username, "password": password}, file)
+        try:
+            os.link(temp_path, self._path(username)) #...then publish it, link fails if the name already exists
+            return True
+        except FileExistsError:
+            return False
+        finally:
+            os.remove(temp_path)
+
+    def remove(self, username):
+        try:
+            os.remove(self._path(username))
+        except FileNotFoundError:
+            pass
+
+    def has_users(self):
+        with os.scandir(self.directory) as entries:
+            return any(entry.name.endswith(".json") for entry in entries) #stops at the first user
+
+    def usernames(self):
+        return [unquote(name[:-len(".json")]) for name in os.listdir(self.directory) if name.endswith(".json")]